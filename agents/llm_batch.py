@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import Future
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+
+class BatchedGeminiClient:
+    """Queue prompts and flush them as one inline Gemini batch job.
+
+    Interactive invoke() pays per-request scheduling overhead and the
+    interactive rate; the batch endpoint aggregates scheduling and is
+    billed at roughly half price. submit() returns a Future, flush()
+    submits everything queued and resolves the futures, so a driver that
+    scores many reports can submit all prompts first and flush once.
+    """
+
+    _TERMINAL_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED")
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", poll_interval: float = 5.0) -> None:
+        from google import genai
+
+        self._client = genai.Client()
+        self.model_name = model_name
+        self.poll_interval = poll_interval
+        self._lock = Lock()
+        self._pending: List[Tuple[str, Future]] = []
+
+    def submit(self, prompt: str) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            self._pending.append((prompt, fut))
+        return fut
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        src = [
+            {"contents": [{"parts": [{"text": prompt}], "role": "user"}]}
+            for prompt, _ in pending
+        ]
+        try:
+            job = self._client.batches.create(model=self.model_name, src=src)
+            while job.state.name not in self._TERMINAL_STATES:
+                time.sleep(self.poll_interval)
+                job = self._client.batches.get(name=job.name)
+        except Exception as e:
+            for _, fut in pending:
+                fut.set_exception(e)
+            return
+
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            err = RuntimeError(f"Gemini batch job ended in state {job.state.name}")
+            for _, fut in pending:
+                fut.set_exception(err)
+            return
+
+        for (_, fut), res in zip(pending, job.dest.inlined_responses):
+            if getattr(res, "error", None):
+                fut.set_exception(RuntimeError(str(res.error)))
+            else:
+                fut.set_result(res.response.text)
+
+
+_BATCH_CLIENTS: Dict[str, BatchedGeminiClient] = {}
+_BATCH_LOCK = Lock()
+
+
+def get_batch_client(model_name: str = "gemini-2.5-flash") -> Optional[BatchedGeminiClient]:
+    """Shared per-model batch client, or None unless AGENT_BATCH_MODE=1."""
+    if os.environ.get("AGENT_BATCH_MODE") != "1":
+        return None
+    with _BATCH_LOCK:
+        client = _BATCH_CLIENTS.get(model_name)
+        if client is None:
+            try:
+                client = BatchedGeminiClient(model_name)
+            except Exception:
+                return None
+            _BATCH_CLIENTS[model_name] = client
+        return client
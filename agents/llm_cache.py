@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+from typing import Optional
+
+# File-per-key cache: key is a blake2b of model+prompt, value is the raw
+# response text. Exact prompt repeats (common in critic/report rerun
+# loops) then skip the network round-trip and token billing entirely.
+# Disable with AGENT_LLM_CACHE=0.
+_CACHE_DIR = os.environ.get("AGENT_LLM_CACHE_DIR", "data/.llm_cache")
+
+
+def enabled() -> bool:
+    return os.environ.get("AGENT_LLM_CACHE", "1") != "0"
+
+
+def _key(llm, prompt: str) -> str:
+    model = getattr(llm, "model", "gemini")
+    return hashlib.blake2b(f"{model}|{prompt}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _get(key: str) -> Optional[str]:
+    try:
+        with open(os.path.join(_CACHE_DIR, key), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _put(key: str, value: str) -> None:
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        tmp = os.path.join(_CACHE_DIR, f".{key}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp, os.path.join(_CACHE_DIR, key))
+    except OSError:
+        pass
+
+
+def cached_invoke(llm, messages, prompt: str) -> str:
+    if not enabled():
+        return llm.invoke(messages).content
+    key = _key(llm, prompt)
+    hit = _get(key)
+    if hit is not None:
+        return hit
+    content = llm.invoke(messages).content
+    _put(key, content)
+    return content
+
+
+# Shared throttle for async LLM traffic. abatch and the parallel graph
+# can burst many simultaneous calls; past the provider's allowed rate
+# they come back as 429s whose backoff retries are slower than just
+# queueing here. Per event loop because a Semaphore is bound to the loop
+# it was created on. Tune with AGENT_LLM_MAX_CONCURRENCY.
+_MAX_CONCURRENCY = int(os.environ.get("AGENT_LLM_MAX_CONCURRENCY", "10"))
+_SEMAPHORES: dict[int, asyncio.Semaphore] = {}
+
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    loop_id = id(asyncio.get_running_loop())
+    sem = _SEMAPHORES.get(loop_id)
+    if sem is None:
+        sem = asyncio.Semaphore(_MAX_CONCURRENCY)
+        _SEMAPHORES[loop_id] = sem
+    return sem
+
+
+async def acached_invoke(llm, messages, prompt: str) -> str:
+    if not enabled():
+        async with _llm_semaphore():
+            return (await llm.ainvoke(messages)).content
+    key = _key(llm, prompt)
+    hit = _get(key)
+    if hit is not None:
+        return hit
+    async with _llm_semaphore():
+        content = (await llm.ainvoke(messages)).content
+    _put(key, content)
+    return content
@@ -1,64 +1,66 @@
 from __future__ import annotations
 import os
-import json
+import re
+import orjson
 from datetime import datetime
+from pathlib import Path
 from typing import Any, Dict, Optional
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemLoader
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
 from .base import Agent
+from .llm_batch import get_batch_client
+from .llm_cache import acached_invoke, cached_invoke
 
+_ENV_CACHE: dict[str, Environment] = {}
 
-class ReportAgent(Agent):
-    def __init__(
-            self,
-            name: str = "Gemini-Reporter",
-            templates_dir: str = "templates",
-            template_name: str = "report.md.j2",
-            out_dir: str = "data/output",
-            out_name: str = "report.md",
-            model_name: str = "gemini-2.5-flash",
-            api_key: Optional[str] = None
-    ) -> None:
-        super().__init__(name)
+_JSON_SPAN = re.compile(rb"\{.*\}", re.DOTALL)
 
-        self.templates_dir = templates_dir
-        self.template_name = template_name
-        self.out_dir = out_dir
-        self.out_name = out_name
 
-        if api_key:
-            os.environ["GOOGLE_API_KEY"] = api_key
+def _parse_llm_json(content: str) -> Dict[str, Any]:
+    """Pull the JSON object out of an LLM reply (fences and all) in one
+    regex pass and parse it with orjson."""
+    m = _JSON_SPAN.search(content.encode("utf-8"))
+    if m is None:
+        raise ValueError("No JSON object found in LLM response")
+    return orjson.loads(m.group(0))
 
-        self.llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=0.3,
-        )
 
-        self._env = Environment(
-            loader=FileSystemLoader(self.templates_dir),
-            autoescape=select_autoescape(enabled_extensions=(".html", ".xml")),
+def _get_env(templates_dir: str) -> Environment:
+    """One Environment per templates dir, shared across agent instances.
+
+    auto_reload=False skips the per-render mtime stat; templates do not
+    change while the pipeline runs.
+    """
+    env = _ENV_CACHE.get(templates_dir)
+    if env is None:
+        env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            # Markdown output: escaping never applies, and False skips the
+            # per-variable Markup wrapping select_autoescape sets up.
+            autoescape=False,
             trim_blocks=True,
             lstrip_blocks=True,
+            auto_reload=False,
+            cache_size=400,
         )
-
-    def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
-        analysis_text = raw_data.get("analysis", "No raw analysis provided.")
-        available_plots = raw_data.get("plots", [])
-        critic_feedback = raw_data.get("critic_notes")
-
-        feedback_context = f"CRITIC FEEDBACK: {critic_feedback}" if critic_feedback else "NO PRIOR FEEDBACK."
-
-        prompt = f"""
+        _ENV_CACHE[templates_dir] = env
+    return env
+
+
+# Prompt skeletons are immutable; building them per call re-rendered a
+# multi-kilobyte f-string each time. Only the three dynamic slots are
+# substituted at call time.
+#
+# Slot order matters for provider prompt-prefix caching: the static
+# instructions lead, then the analysis/plots (invariant across critic
+# reruns), and the volatile feedback sits at the very end, so a rerun
+# only invalidates the cached prefix from the feedback onward.
+_REPORT_PROMPT_TEMPLATE = """
         You are an expert Senior Data Reporter. Your task is to generate a structured markdown report where visual evidence drives the narrative.
 
-        INPUT DATA:
-        1. Raw Analysis: {analysis_text}
-        2. Available Plot Files: {available_plots}
-        3. Context/Feedback: {feedback_context}
-
         INSTRUCTIONS:
 
         1. **Executive Overview**:
@@ -100,35 +102,148 @@ class ReportAgent(Agent):
             "conclusion": "Final summary and recommendations text...",
             "change_log": "Explanation of fixes or null"
         }}
+
+        INPUT DATA:
+        1. Raw Analysis: {analysis}
+        2. Available Plot Files: {plots}
+        3. Context/Feedback: {feedback}
         """
 
+_REPORT_PARALLEL_PROMPT_TEMPLATE = """
+        You are an expert Senior Data Reporter. Your task is to generate the Overview and Conclusion for a report.
+
+        INSTRUCTIONS:
+
+        1. **Executive Overview**:
+           - Write a compelling "Big Picture" summary for stakeholders.
+
+        2. **Structured Analysis (The Core)**:
+           - SKIP. Another agent is doing this.
+
+        3. **Final Synthesis & Recommendations**:
+           - Write a strong **Conclusion** paragraph.
+           - Synthesize findings from the plots and raw analysis.
+           - Provide concrete recommendations based on data.
+
+        4. **Handling Feedback**:
+           - If 'Context' indicates CRITIC FEEDBACK, generate a `change_log`.
+
+        JSON STRUCTURE:
+        {{
+            "title": "Measurement Data Report",
+            "overview": "The executive summary...",
+            "sections": null,
+            "conclusion": "Final summary and recommendations text...",
+            "change_log": "Explanation of fixes or null"
+        }}
+
+        INPUT DATA:
+        1. Raw Analysis: {analysis}
+        2. Available Plot Files: {plots}
+        3. Context/Feedback: {feedback}
+        """
+
+
+class ReportAgent(Agent):
+    _PROMPT_TEMPLATE = _REPORT_PROMPT_TEMPLATE
+    def __init__(
+            self,
+            name: str = "Gemini-Reporter",
+            templates_dir: str = "templates",
+            template_name: str = "report.md.j2",
+            out_dir: str = "data/output",
+            out_name: str = "report.md",
+            model_name: str = "gemini-2.5-flash",
+            api_key: Optional[str] = None
+    ) -> None:
+        super().__init__(name)
+
+        self.templates_dir = templates_dir
+        self.template_name = template_name
+        self.out_dir = out_dir
+        self.out_name = out_name
+
+        if api_key:
+            os.environ["GOOGLE_API_KEY"] = api_key
+
+        self.llm = ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=0.3,
+        )
+
+        self._env = _get_env(self.templates_dir)
+        self._template = self._env.get_template(self.template_name)
+        self._batch_client = get_batch_client(model_name)
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def _curate_prompt(self, raw_data: Dict[str, Any]) -> str:
+        analysis_text = raw_data.get("analysis", "No raw analysis provided.")
+        available_plots = raw_data.get("plots", [])
+        critic_feedback = raw_data.get("critic_notes")
+
+        feedback_context = f"CRITIC FEEDBACK: {critic_feedback}" if critic_feedback else "NO PRIOR FEEDBACK."
+
+        return self._PROMPT_TEMPLATE.format(
+            analysis=analysis_text,
+            plots=available_plots,
+            feedback=feedback_context,
+        )
+
+    def _fallback_content(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        fallback_plots = raw_data.get("plots", [])[:3]
+        sections = []
+        for p in fallback_plots:
+            sections.append({
+                "heading": "Analysis (Fallback)",
+                "plot_path": p,
+                "content": "Automated description unavailable due to LLM error."
+            })
+
+        return {
+            "title": raw_data.get("title", "Report (Fallback)"),
+            "overview": "Overview failed.",
+            "sections": sections,
+            "change_log": None
+        }
+
+    def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = self._curate_prompt(raw_data)
+        try:
+            if self._batch_client is not None:
+                fut = self._batch_client.submit(prompt)
+                self._batch_client.flush()
+                raw = fut.result()
+            else:
+                raw = cached_invoke(self.llm, [HumanMessage(content=prompt)], prompt)
+            return _parse_llm_json(raw)
+
+        except Exception as e:
+            print(f"[{self.name}] LLM Error (fallback): {e}")
+            return self._fallback_content(raw_data)
+
+    async def _acurate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = self._curate_prompt(raw_data)
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            content = response.content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            raw = await acached_invoke(self.llm, [HumanMessage(content=prompt)], prompt)
+            return _parse_llm_json(raw)
 
         except Exception as e:
             print(f"[{self.name}] LLM Error (fallback): {e}")
-            fallback_plots = raw_data.get("plots", [])[:3]
-            sections = []
-            for p in fallback_plots:
-                sections.append({
-                    "heading": "Analysis (Fallback)",
-                    "plot_path": p,
-                    "content": "Automated description unavailable due to LLM error."
-                })
-
-            return {
-                "title": raw_data.get("title", "Report (Fallback)"),
-                "overview": "Overview failed.",
-                "sections": sections,
-                "change_log": None
-            }
+            return self._fallback_content(raw_data)
 
     def run(self, **kwargs: Any) -> Dict[str, Any]:
-        os.makedirs(self.out_dir, exist_ok=True)
         print(f"[{self.name}] Generating structured report...")
         curated_content = self._curate_content_with_llm(kwargs)
+        return self._finish(curated_content, kwargs)
+
+    async def arun(self, **kwargs: Any) -> Dict[str, Any]:
+        """Async run(); lets the reporter overlap its Gemini round-trip with
+        other agents under asyncio.gather."""
+        print(f"[{self.name}] Generating structured report...")
+        curated_content = await self._acurate_content_with_llm(kwargs)
+        return self._finish(curated_content, kwargs)
+
+    def _finish(self, curated_content: Dict[str, Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
         c_notes = kwargs.get("critic_notes")
         if not c_notes: c_notes = ""
         used_plots = [s.get("plot_path") for s in curated_content.get("sections", []) if s.get("plot_path")]
@@ -143,16 +258,16 @@ class ReportAgent(Agent):
             "critic_decision": kwargs.get("critic_decision"),
             "plots": used_plots
         }
-        template = self._env.get_template(self.template_name)
-        md = template.render(**payload)
+        md = self._template.render(**payload)
         out_path = os.path.join(self.out_dir, self.out_name)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(md)
+        Path(out_path).write_text(md, encoding="utf-8")
         return {"report_path": out_path, "report_markdown": md}
 
 
 
 class ReportParallelAgent(ReportAgent):
+    _PROMPT_TEMPLATE = _REPORT_PARALLEL_PROMPT_TEMPLATE
+
     def __init__(
             self,
             name: str = "Gemini-Reporter",
@@ -165,67 +280,16 @@ class ReportParallelAgent(ReportAgent):
     ) -> None:
         super().__init__(name, templates_dir, template_name, out_dir, out_name, model_name, api_key)
 
-    def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
-        analysis_text = raw_data.get("analysis", "No raw analysis provided.")
-        available_plots = raw_data.get("plots", [])
-        critic_feedback = raw_data.get("critic_notes")
-
-        feedback_context = f"CRITIC FEEDBACK: {critic_feedback}" if critic_feedback else "NO PRIOR FEEDBACK."
-
-        prompt = f"""
-        You are an expert Senior Data Reporter. Your task is to generate the Overview and Conclusion for a report.
-
-        INPUT DATA:
-        1. Raw Analysis: {analysis_text}
-        2. Available Plot Files: {available_plots}
-        3. Context/Feedback: {feedback_context}
-
-        INSTRUCTIONS:
-
-        1. **Executive Overview**:
-           - Write a compelling "Big Picture" summary for stakeholders.
-
-        2. **Structured Analysis (The Core)**:
-           - SKIP. Another agent is doing this.
-
-        3. **Final Synthesis & Recommendations**:
-           - Write a strong **Conclusion** paragraph.
-           - Synthesize findings from the plots and raw analysis.
-           - Provide concrete recommendations based on data.
-
-        4. **Handling Feedback**:
-           - If 'Context' indicates CRITIC FEEDBACK, generate a `change_log`.
-
-        JSON STRUCTURE:
-        {{
-            "title": "Measurement Data Report",
-            "overview": "The executive summary...",
-            "sections": null,
-            "conclusion": "Final summary and recommendations text...",
-            "change_log": "Explanation of fixes or null"
-        }}
-        """
-
-        try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            content = response.content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
-
-        except Exception as e:
-            print(f"[{self.name}] LLM Error (fallback): {e}")
-            return {
-                "title": raw_data.get("title", "Report (Fallback)"),
-                "overview": "Overview failed.",
-                "sections": None,
-                "conclusion": "Conclusion failed.",
-                "change_log": None
-            }
-
-    def run(self, **kwargs: Any) -> Dict[str, Any]:
-        os.makedirs(self.out_dir, exist_ok=True)
-        print(f"[{self.name}] Generating structured report (Overview/Conclusion)...")
-        curated_content = self._curate_content_with_llm(kwargs)
+    def _fallback_content(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "title": raw_data.get("title", "Report (Fallback)"),
+            "overview": "Overview failed.",
+            "sections": None,
+            "conclusion": "Conclusion failed.",
+            "change_log": None
+        }
 
+    def _finish(self, curated_content: Dict[str, Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
         c_notes = kwargs.get("critic_notes")
         if not c_notes: c_notes = ""
 
@@ -243,9 +307,7 @@ class ReportParallelAgent(ReportAgent):
             "critic_decision": kwargs.get("critic_decision"),
             "plots": used_plots
         }
-        template = self._env.get_template(self.template_name)
-        md = template.render(**payload)
+        md = self._template.render(**payload)
         out_path = os.path.join(self.out_dir, self.out_name)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(md)
+        Path(out_path).write_text(md, encoding="utf-8")
         return {"report_path": out_path, "report_markdown": md}
@@ -1,17 +1,165 @@
+import hashlib
 import os
 
 import matplotlib
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 matplotlib.use('Agg')
-from typing import List, Any, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Any, Dict, Optional, Tuple
 from .base import Agent
-import json
 from langchain_core.messages import HumanMessage
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from .llm_cache import acached_invoke, cached_invoke
+from .report import _get_env, _parse_llm_json
+
+
+# Plot workers live at module level so ProcessPoolExecutor can pickle
+# them without dragging the agent (and its LLM client) along. Agg is not
+# thread-safe but each worker process owns its own renderer.
+
+# One Figure per process, cleared between plots; allocating a fresh
+# Figure + Axes + canvas per call dominates the cost of tiny plots.
+_FIG = None
+
+
+def _get_fig():
+    global _FIG
+    if _FIG is None:
+        _FIG = plt.figure()
+    return _FIG
+
+
+def _plot_fingerprint(tag: str, df: pd.DataFrame, cols: List[str]) -> str:
+    """Stable short hash of the plotted data; doubles as a safe filename
+    (column names with spaces/slashes never reach the filesystem) and as
+    a memo key so unchanged data skips the render."""
+    h = hashlib.blake2b(f"{tag}:{len(df)}".encode(), digest_size=8)
+    for c in cols:
+        h.update(str(int(pd.util.hash_pandas_object(df[c], index=False).sum())).encode())
+    return h.hexdigest()
+
+
+def _plot_hist(df: pd.DataFrame, col: str, out_dir: str) -> str:
+    key = _plot_fingerprint(f"hist:{col}", df, [col])
+    out = os.path.join(out_dir, f"hist_{key}.png")
+    if os.path.exists(out):
+        return out
+    fig = _get_fig()
+    fig.clear()
+    ax = fig.add_subplot(111)
+    df[col].plot(kind="hist", bins=20, ax=ax)
+    ax.set_title(f"Histogram of {col}")
+    ax.set_xlabel(col)
+    ax.set_ylabel("count")
+    fig.tight_layout()
+    fig.savefig(out)
+    return out
+
+
+_MAX_SCATTER_POINTS = 50000
+
+
+def _plot_scatter(df: pd.DataFrame, a: str, b: str, out_dir: str) -> str:
+    key = _plot_fingerprint(f"scatter:{a}:{b}", df, [a, b])
+    out = os.path.join(out_dir, f"scatter_{key}.png")
+    if os.path.exists(out):
+        return out
+    x = df[a].to_numpy()
+    y = df[b].to_numpy()
+    n = len(x)
+    if n > _MAX_SCATTER_POINTS:
+        # Past ~50k points the cloud is visually saturated anyway; a fixed
+        # seed keeps reruns reproducible.
+        idx = np.random.default_rng(0).choice(n, _MAX_SCATTER_POINTS, replace=False)
+        x, y = x[idx], y[idx]
+    fig = _get_fig()
+    fig.clear()
+    ax = fig.add_subplot(111)
+    ax.scatter(x, y, s=18, rasterized=True)
+    ax.set_title(f"{a} vs {b}")
+    ax.set_xlabel(a)
+    ax.set_ylabel(b)
+    fig.tight_layout()
+    fig.savefig(out, dpi=100)
+    return out
+
+
+def _plot_corr_heatmap(df: pd.DataFrame, num_cols: List[str], out_dir: str) -> str:
+    key = _plot_fingerprint("heatmap:" + ",".join(num_cols), df, num_cols)
+    out = os.path.join(out_dir, f"corr_heatmap_{key}.png")
+    if os.path.exists(out):
+        return out
+    # float32 halves the bytes moved and turns the correlation into a
+    # single BLAS GEMM instead of pandas' per-pair computation.
+    arr = df[num_cols].to_numpy(dtype=np.float32, copy=False)
+    arr = arr - arr.mean(axis=0)
+    arr /= arr.std(axis=0) + 1e-12
+    corr = (arr.T @ arr) / arr.shape[0]
+    fig = _get_fig()
+    fig.clear()
+    ax = fig.add_subplot(111)
+    im = ax.imshow(corr, interpolation="nearest")
+    fig.colorbar(im, ax=ax)
+    ax.set_xticks(range(len(num_cols)))
+    ax.set_xticklabels(num_cols, rotation=45, ha="right")
+    ax.set_yticks(range(len(num_cols)))
+    ax.set_yticklabels(num_cols)
+    ax.set_title("Correlation heatmap")
+    fig.tight_layout()
+    fig.savefig(out)
+    return out
+
+
+# Immutable prompt skeleton, formatted once per call with the three
+# dynamic slots; mirrors the constants in report.py.
+_VIS_PROMPT_TEMPLATE = """
+        You are an expert Senior Data Reporter. Your task is to generate a structured markdown report where visual evidence drives the narrative.
+
+        INPUT DATA:
+        1. Raw Analysis: {analysis}
+        2. Available Plot Files: {plots}
+        3. Context/Feedback: {feedback}
+
+        INSTRUCTIONS:
+
+        1. **Executive Overview**:
+           - SKIP. Another agent is doing this.
+
+        2. **Structured Analysis (The Core)**:
+           - Organize the report into **logical sections**.
+           - For each key insight, select **ONE** relevant plot.
+           - **Structure**: The plot comes first, followed by the deep-dive analysis of that specific plot.
+           - **Selection Limit**: Create MAXIMUM 3-5 sections (one plot per section). Choose only the most impactful plots.
+
+        3. **Final Synthesis & Recommendations**:
+           - SKIP. Another agent is doing this.
+
+        4. **Handling Feedback**:
+           - If 'Context' indicates CRITIC FEEDBACK, generate a `change_log`.
+           - Explain how you fixed the issues (e.g., "Reviewer requested X, so I added section Y").
+           - If no feedback, `change_log` is null.
+
+        JSON STRUCTURE:
+        {{
+            "title": "Measurement Data Report",
+            "overview": null,
+            "sections": [
+                {{
+                    "heading": "Subheader for this insight...",
+                    "plot_path": "path/to/selected_plot.png",
+                    "content": "Deep dive analysis specifically describing this plot..."
+                }}
+            ],
+            "conclusion": null,
+            "change_log": "Explanation of fixes or null"
+        }}
+        """
+
 
 class VisualizationAgent(Agent):
     MIN_COLS_FOR_HEATMAP = 3
@@ -23,52 +171,57 @@ class VisualizationAgent(Agent):
     ) -> None:
         super().__init__(name)
         self.out_dir = out_dir
+        self._ensured = False
 
     def _ensure_out(self) -> None:
+        if self._ensured:
+            return
         os.makedirs(self.out_dir, exist_ok=True)
+        self._ensured = True
 
-    def _plot_hist(self, df: pd.DataFrame, col: str) -> str:
-        self._ensure_out()
-        plt.figure()
-        df[col].plot(kind="hist", bins=20)
-        plt.title(f"Histogram of {col}")
-        plt.xlabel(col)
-        plt.ylabel("count")
-        out = os.path.join(self.out_dir, f"hist_{col}.png")
-        plt.tight_layout()
-        plt.savefig(out)
-        plt.close()
-        return out
-
-    def _plot_scatter(self, df: pd.DataFrame, a: str, b: str) -> str:
-        self._ensure_out()
-        plt.figure()
-        plt.scatter(df[a], df[b], s=18)
-        plt.title(f"{a} vs {b}")
-        plt.xlabel(a)
-        plt.ylabel(b)
-        out = os.path.join(self.out_dir, f"scatter_{a}_vs_{b}.png")
-        plt.tight_layout()
-        plt.savefig(out)
-        plt.close()
-        return out
+    @staticmethod
+    def _plan_columns(viz_plan: Dict[str, Any]) -> set:
+        needed = set(viz_plan.get("hists", []))
+        for pair in viz_plan.get("pairs", []):
+            if isinstance(pair, (list, tuple)) and len(pair) == 2:
+                needed.update(pair)
+        return needed
+
+    def _load_frame(
+        self, data_path: str, parquet_path: str | None, viz_plan: Dict[str, Any]
+    ) -> pd.DataFrame:
+        needed = self._plan_columns(viz_plan)
+        heatmap = viz_plan.get("heatmap", False)
+
+        # Prefer the analyst's parquet copy: dtypes travel in the footer,
+        # so the reload is a columnar copy instead of a fresh CSV parse
+        # with type inference — and reruns pay it again and again.
+        if parquet_path and os.path.isfile(parquet_path):
+            try:
+                df = pd.read_parquet(parquet_path)
+                if not heatmap:
+                    df = df[[c for c in df.columns if c in needed]]
+                return df
+            except Exception:
+                pass
+
+        # CSV fallback: parse only the columns the plan actually
+        # references; a cheap header/probe read decides the set (and
+        # per-column dtypes) before the real parse.
+        header_cols = pd.read_csv(data_path, nrows=0).columns
+        probe = pd.read_csv(data_path, nrows=1024)
+        probe_num = probe.select_dtypes(include=["number"]).columns
+        if heatmap:
+            needed.update(probe_num)
+        usecols = [c for c in header_cols if c in needed]
+        # float32 is plenty for plotting and halves parse output memory;
+        # pinning the dtype also skips the parser's inference pass.
+        dtypes = {c: "float32" for c in probe_num if c in needed}
 
-    def _plot_corr_heatmap(self, df: pd.DataFrame, num_cols: List[str]) -> str | None:
-        if len(num_cols) < self.MIN_COLS_FOR_HEATMAP:
-            return None
-        corr = df[num_cols].corr()
-        self._ensure_out()
-        plt.figure()
-        im = plt.imshow(corr, interpolation="nearest")
-        plt.colorbar(im)
-        plt.xticks(range(len(num_cols)), num_cols, rotation=45, ha="right")
-        plt.yticks(range(len(num_cols)), num_cols)
-        plt.title("Correlation heatmap")
-        plt.tight_layout()
-        out = os.path.join(self.out_dir, "corr_heatmap.png")
-        plt.savefig(out)
-        plt.close()
-        return out
+        try:
+            return pd.read_csv(data_path, engine="pyarrow", usecols=usecols, dtype=dtypes)
+        except Exception:
+            return pd.read_csv(data_path, usecols=usecols, dtype=dtypes)
 
     def run(self, **kwargs: Any) -> Dict[str, Any]:
         data_path: str = kwargs["data_path"]
@@ -79,26 +232,39 @@ class VisualizationAgent(Agent):
                 f"Visualizer expected cleaned file at '{data_path}'"
             )
 
-        df = pd.read_csv(data_path)
+        df = self._load_frame(data_path, kwargs.get("data_path_parquet"), viz_plan)
         num_cols = df.select_dtypes(include=["number"]).columns.tolist()
 
-        plots: List[str] = []
+        self._ensure_out()
+        tasks: List[Tuple[Any, tuple]] = []
 
+        # Submit only the columns each worker plots: every submit pickles
+        # its arguments, and shipping the whole frame to every task costs
+        # more than the render it parallelizes.
         for col in viz_plan.get("hists", []):
             if col in df.columns:
-                plots.append(self._plot_hist(df, col))
+                tasks.append((_plot_hist, (df[[col]], col, self.out_dir)))
 
         for pair in viz_plan.get("pairs", []):
             if not isinstance(pair, (list, tuple)) or len(pair) != 2:
                 continue
             a, b = pair
             if a in df.columns and b in df.columns:
-                plots.append(self._plot_scatter(df, a, b))
+                tasks.append((_plot_scatter, (df[[a, b]], a, b, self.out_dir)))
 
-        if viz_plan.get("heatmap", False):
-            path = self._plot_corr_heatmap(df, num_cols)
-            if path:
-                plots.append(path)
+        if viz_plan.get("heatmap", False) and len(num_cols) >= self.MIN_COLS_FOR_HEATMAP:
+            tasks.append((_plot_corr_heatmap, (df[num_cols], num_cols, self.out_dir)))
+
+        # PNG encoding is embarrassingly parallel; fan out once there is
+        # more than one plot to render. Results keep submission order.
+        if len(tasks) <= 1:
+            plots = [fn(*args) for fn, args in tasks]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(len(tasks), os.cpu_count() or 1)
+            ) as ex:
+                futures = [ex.submit(fn, *args) for fn, args in tasks]
+                plots = [f.result() for f in futures]
 
         return {"plots": plots}
 
@@ -122,6 +288,7 @@ class VisualizationParallelAgent(VisualizationAgent):
 
         self.report_out_dir = out_dir
         self.out_name = out_name
+        os.makedirs(self.report_out_dir, exist_ok=True)
 
         if api_key:
             os.environ["GOOGLE_API_KEY"] = api_key
@@ -131,97 +298,99 @@ class VisualizationParallelAgent(VisualizationAgent):
             temperature=0.3,
         )
 
-        self._env = Environment(
-            loader=FileSystemLoader(self.templates_dir),
-            autoescape=select_autoescape(enabled_extensions=(".html", ".xml")),
-            trim_blocks=True,
-            lstrip_blocks=True,
-        )
+        self._env = _get_env(self.templates_dir)
+        self._template = self._env.get_template(self.template_name)
 
-    def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _curate_prompt(self, raw_data: Dict[str, Any]) -> str:
         analysis_text = raw_data.get("analysis", "No raw analysis provided.")
         available_plots = raw_data.get("plots", [])
         critic_feedback = raw_data.get("critic_notes")
 
         feedback_context = f"CRITIC FEEDBACK: {critic_feedback}" if critic_feedback else "NO PRIOR FEEDBACK."
 
-        prompt = f"""
-        You are an expert Senior Data Reporter. Your task is to generate a structured markdown report where visual evidence drives the narrative.
-
-        INPUT DATA:
-        1. Raw Analysis: {analysis_text}
-        2. Available Plot Files: {available_plots}
-        3. Context/Feedback: {feedback_context}
-
-        INSTRUCTIONS:
-
-        1. **Executive Overview**:
-           - SKIP. Another agent is doing this.
+        return _VIS_PROMPT_TEMPLATE.format(
+            analysis=analysis_text,
+            plots=available_plots,
+            feedback=feedback_context,
+        )
 
-        2. **Structured Analysis (The Core)**:
-           - Organize the report into **logical sections**.
-           - For each key insight, select **ONE** relevant plot.
-           - **Structure**: The plot comes first, followed by the deep-dive analysis of that specific plot.
-           - **Selection Limit**: Create MAXIMUM 3-5 sections (one plot per section). Choose only the most impactful plots.
+    def _fallback_content(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        fallback_plots = raw_data.get("plots", [])[:3]
+        sections = []
+        for p in fallback_plots:
+            sections.append({
+                "heading": "Analysis (Fallback)",
+                "plot_path": p,
+                "content": "Automated description unavailable due to LLM error."
+            })
 
-        3. **Final Synthesis & Recommendations**:
-           - SKIP. Another agent is doing this.
+        return {
+            "title": raw_data.get("title", "Report (Fallback)"),
+            "overview": None,
+            "sections": sections,
+            "change_log": None
+        }
 
-        4. **Handling Feedback**:
-           - If 'Context' indicates CRITIC FEEDBACK, generate a `change_log`.
-           - Explain how you fixed the issues (e.g., "Reviewer requested X, so I added section Y").
-           - If no feedback, `change_log` is null.
+    def _curate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = self._curate_prompt(raw_data)
+        try:
+            raw = cached_invoke(self.llm, [HumanMessage(content=prompt)], prompt)
+            return _parse_llm_json(raw)
 
-        JSON STRUCTURE:
-        {{
-            "title": "Measurement Data Report",
-            "overview": null,
-            "sections": [
-                {{
-                    "heading": "Subheader for this insight...",
-                    "plot_path": "path/to/selected_plot.png",
-                    "content": "Deep dive analysis specifically describing this plot..."
-                }}
-            ],
-            "conclusion": null,
-            "change_log": "Explanation of fixes or null"
-        }}
-        """
+        except Exception as e:
+            print(f"[{self.name}] LLM Error (fallback): {e}")
+            return self._fallback_content(raw_data)
 
+    async def _acurate_content_with_llm(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = self._curate_prompt(raw_data)
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            content = response.content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            raw = await acached_invoke(self.llm, [HumanMessage(content=prompt)], prompt)
+            return _parse_llm_json(raw)
 
         except Exception as e:
             print(f"[{self.name}] LLM Error (fallback): {e}")
-            fallback_plots = raw_data.get("plots", [])[:3]
-            sections = []
-            for p in fallback_plots:
-                sections.append({
-                    "heading": "Analysis (Fallback)",
-                    "plot_path": p,
-                    "content": "Automated description unavailable due to LLM error."
-                })
-
-            return {
-                "title": raw_data.get("title", "Report (Fallback)"),
-                "overview": None,
-                "sections": sections,
-                "change_log": None
-            }
+            return self._fallback_content(raw_data)
 
-    def run(self, **kwargs: Any) -> Dict[str, Any]:
-        plots = []
+    def _resolve_plots(self, kwargs: Dict[str, Any]) -> List[str]:
         if "plots" in kwargs and kwargs["plots"]:
-            plots = kwargs["plots"]
-        else:
-            plot_res = super().run(**kwargs)
-            plots = plot_res["plots"]
+            return kwargs["plots"]
+        return super().run(**kwargs)["plots"]
+
+    def _empty_content(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """With no plots there is nothing for the LLM to narrate; skip the
+        round-trip and emit an empty sections payload directly."""
+        return {
+            "title": kwargs.get("title", "Analysis Report"),
+            "overview": None,
+            "sections": [],
+            "change_log": None,
+        }
+
+    def run(self, **kwargs: Any) -> Dict[str, Any]:
+        plots = self._resolve_plots(kwargs)
+
+        if not plots:
+            return self._finish(self._empty_content(kwargs), kwargs, plots)
 
         print(f"[{self.name}] Generating structured analysis section...")
         curated_content = self._curate_content_with_llm({**kwargs, "plots": plots})
+        return self._finish(curated_content, kwargs, plots)
+
+    async def arun(self, **kwargs: Any) -> Dict[str, Any]:
+        """Async run(); plot rendering stays synchronous but the curation
+        round-trip can overlap the reporter's under asyncio.gather."""
+        plots = self._resolve_plots(kwargs)
+
+        if not plots:
+            return self._finish(self._empty_content(kwargs), kwargs, plots)
 
+        print(f"[{self.name}] Generating structured analysis section...")
+        curated_content = await self._acurate_content_with_llm({**kwargs, "plots": plots})
+        return self._finish(curated_content, kwargs, plots)
+
+    def _finish(
+        self, curated_content: Dict[str, Any], kwargs: Dict[str, Any], plots: List[str]
+    ) -> Dict[str, Any]:
         c_notes = kwargs.get("critic_notes") or ""
         used_plots = [s.get("plot_path") for s in curated_content.get("sections", []) if s.get("plot_path")]
 
@@ -237,13 +406,10 @@ class VisualizationParallelAgent(VisualizationAgent):
             "plots": used_plots
         }
 
-        template = self._env.get_template(self.template_name)
-        md = template.render(**payload)
+        md = self._template.render(**payload)
 
-        os.makedirs(self.report_out_dir, exist_ok=True)
         out_path = os.path.join(self.report_out_dir, self.out_name)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(md)
+        Path(out_path).write_text(md, encoding="utf-8")
 
         return {
             "report_path": out_path,
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import functools
 import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Response, render_template, request, send_file, jsonify, stream_with_context
 
 from agents.analyst import AnalystAgent
 from agents.assemble import AssemblerAgent
@@ -12,18 +15,46 @@ from agents.visualizer import VisualizationAgent, VisualizationParallelAgent
 from core.orchestrator_parallel import ParallelOrchestrator
 from core.orchestrator_sequential import OrchestratorSequential
 from utils.utils import ensure_dirs, allowed_file
-from utils.app_utils import embed_images_in_markdown, convert_markdown_to_html
+from utils.app_utils import render_all
 
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = 'data/input'
-app.config['ALLOWED_EXTENSIONS'] = {'csv'}
+app.config['ALLOWED_EXTENSIONS'] = frozenset({'csv'})
+
+# secure_filename is a pure function; clients re-send the same names
+# (upload then repeated downloads), so memoize the sanitization.
+_secure_filename = functools.lru_cache(maxsize=512)(secure_filename)
 
 
 ensure_dirs()
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Pipelines run for minutes; holding the request thread that long blocks
+# a Flask worker slot per upload. /process now just submits the job here
+# and the client polls /status/<job_id>.
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+JOBS: dict[str, Future] = {}
+
+# Agents are stateless between runs but expensive to build (LLM clients,
+# compiled templates); construct each set once at import and share them
+# across requests.
+_AGENTS_SEQ = dict(
+    analyst=AnalystAgent(),
+    visualizer=VisualizationAgent(),
+    critic=CriticAgent(),
+    reporter=ReportAgent(),
+)
+_AGENTS_PAR = dict(
+    analyst=AnalystAgent(),
+    visualizer=VisualizationParallelAgent(),
+    critic_vis=CriticVisAgent(),
+    critic_rep=CriticRepAgent(),
+    reporter=ReportParallelAgent(),
+    assembler=AssemblerAgent(),
+)
+
 
 @app.route('/')
 def index():
@@ -31,9 +62,41 @@ def index():
     return render_template('index.html')
 
 
+def _run_pipeline(file_path: str, mode: str) -> dict:
+    """Full orchestrator + markdown/HTML conversion; runs on _EXECUTOR."""
+    if mode == 'seq':
+        orch = OrchestratorSequential(**_AGENTS_SEQ)
+    elif mode == 'par':
+        orch = ParallelOrchestrator(**_AGENTS_PAR)
+
+    result = orch.run(data_path=file_path)
+
+    report_md_path = result.get('report_path') or result.get('final_report_path')
+    if not report_md_path or not os.path.exists(report_md_path):
+        raise RuntimeError('Report generation failed')
+
+    report_html_path = report_md_path.replace('.md', '.html')
+    try:
+        render_all(report_md_path, report_html_path)
+        html_success = os.path.exists(report_html_path)
+    except Exception as html_error:
+        app.logger.warning(f'HTML conversion failed: {html_error}')
+        html_success = False
+
+    report_md_filename = os.path.basename(report_md_path)
+    report_html_filename = os.path.basename(report_html_path) if html_success else None
+
+    return {
+        'success': True,
+        'report_md_filename': report_md_filename,
+        'report_html_filename': report_html_filename,
+        'message': 'Work is done!'
+    }
+
+
 @app.route('/process', methods=['POST'])
 def process():
-    """Process the uploaded file and prompt."""
+    """Accept the upload, queue the pipeline, return a job id."""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -47,68 +110,121 @@ def process():
             return jsonify({'error': 'Only CSV files are allowed'}), 400
 
 
-        filename = secure_filename(file.filename)
+        filename = _secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(file_path)
         mode = request.form.get('execution_mode', 'seq')
-        if mode == 'seq':
-            orch = OrchestratorSequential(
-                analyst=AnalystAgent(),
-                visualizer=VisualizationAgent(),
-                critic=CriticAgent(),
-                reporter=ReportAgent()
-            )
-        elif mode == 'par':
-            orch = ParallelOrchestrator(
-                analyst=AnalystAgent(),
-                visualizer=VisualizationParallelAgent(),
-                critic_vis=CriticVisAgent(),
-                critic_rep=CriticRepAgent(),
-                reporter=ReportParallelAgent(),
-                assembler=AssemblerAgent()
-            )
 
-        result = orch.run(data_path=file_path)
+        job_id = uuid.uuid4().hex
+        JOBS[job_id] = _EXECUTOR.submit(_run_pipeline, file_path, mode)
+        return jsonify({'job_id': job_id}), 202
 
-        report_md_path = report_md_path = result.get('report_path') or result.get('final_report_path')
-        if not report_md_path or not os.path.exists(report_md_path):
-            return jsonify({'error': 'Report generation failed'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
-        try:
-            embed_images_in_markdown(report_md_path)
-        except Exception as md_error:
-            app.logger.warning(f'Failed to embed images in markdown: {md_error}')
 
-        report_html_path = report_md_path.replace('.md', '.html')
-        try:
-            convert_markdown_to_html(report_md_path, report_html_path)
-            html_success = os.path.exists(report_html_path)
-        except Exception as html_error:
-            app.logger.warning(f'HTML conversion failed: {html_error}')
-            html_success = False
+@app.route('/process-stream', methods=['POST'])
+def process_stream():
+    """Streamed upload: raw CSV body copied straight to disk.
 
-        report_md_filename = os.path.basename(report_md_path)
-        report_html_filename = os.path.basename(report_html_path) if html_success else None
+    Skips Werkzeug's multipart parse (and its temp-file spool + copy),
+    so each upload is written to disk exactly once. Filename and mode
+    travel in headers since there is no form.
+    """
+    try:
+        filename = _secure_filename(request.headers.get('X-Filename', ''))
+        if not filename:
+            return jsonify({'error': 'No file provided'}), 400
+        if not allowed_file(filename, app.config['ALLOWED_EXTENSIONS']):
+            return jsonify({'error': 'Only CSV files are allowed'}), 400
 
-        return jsonify({
-            'success': True,
-            'report_md_filename': report_md_filename,
-            'report_html_filename': report_html_filename,
-            'message': 'Work is done!'
-        })
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        max_bytes = app.config['MAX_CONTENT_LENGTH']
+        written = 0
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = request.stream.read(1 << 20)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    f.close()
+                    os.remove(file_path)
+                    return jsonify({'error': 'File too large'}), 413
+                f.write(chunk)
+        if written == 0:
+            os.remove(file_path)
+            return jsonify({'error': 'No file selected'}), 400
+
+        mode = request.headers.get('X-Mode', 'seq')
+
+        job_id = uuid.uuid4().hex
+        JOBS[job_id] = _EXECUTOR.submit(_run_pipeline, file_path, mode)
+        return jsonify({'job_id': job_id}), 202
 
     except Exception as e:
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
 
+@app.route('/status/<job_id>')
+def job_status(job_id: str):
+    """Poll a queued pipeline job."""
+    future = JOBS.get(job_id)
+    if future is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    if not future.done():
+        return jsonify({'status': 'running'})
+    JOBS.pop(job_id, None)
+    try:
+        result = future.result()
+    except Exception as e:
+        return jsonify({'status': 'failed', 'error': f'Processing failed: {str(e)}'}), 500
+
+    # ?inline=1 streams the finished HTML straight back instead of making
+    # the client do a second /download round-trip.
+    if request.args.get('inline') == '1' and result.get('report_html_filename'):
+        html_path = os.path.join('data/output', result['report_html_filename'])
+        if os.path.exists(html_path):
+            return Response(
+                stream_with_context(_file_chunks(html_path)),
+                mimetype='text/html',
+            )
+
+    return jsonify({'status': 'done', **result})
+
+
+def _file_chunks(path: str, chunk_size: int = 64 * 1024):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
 @app.route('/download/<filename>')
 def download_file(filename: str):
     """Download the generated report file."""
     try:
-        report_path = os.path.join('data/output', secure_filename(filename))
+        report_path = os.path.join('data/output', _secure_filename(filename))
         if not os.path.exists(report_path):
             return jsonify({'error': 'File not found'}), 404
-        return send_file(report_path, as_attachment=True)
+        # conditional+etag lets client retries answer with 304 instead of
+        # retransmitting the whole report, and routes the body through
+        # wsgi.file_wrapper (sendfile) where the server supports it.
+        resp = send_file(
+            report_path,
+            as_attachment=True,
+            conditional=True,
+            etag=True,
+            last_modified=os.path.getmtime(report_path),
+        )
+        # Download names are fixed across datasets (every upload produces
+        # report_final.md), so any freshness lifetime lets the browser
+        # replay an older dataset's report without asking. no-cache
+        # forces the ETag revalidation; unchanged files still 304.
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
     except Exception as e:
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
@@ -1,17 +1,37 @@
 from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import os
+
+from langgraph.constants import Send
 from langgraph.graph import StateGraph, END
 
 from agents.analyst import AnalystAgent
 from agents.visualizer import VisualizationAgent, VisualizationParallelAgent
-from agents.critic import CriticAgent, CriticRepAgent, CriticVisAgent
+from agents.critic import BatchCriticAgent, CriticAgent, CriticRepAgent, CriticVisAgent
 from agents.report import ReportAgent, ReportParallelAgent
 from agents.assemble import AssemblerAgent
 from .state import GraphState, GraphParallelState
 from core.orchestrator import Orchestrator
 
+logger = logging.getLogger(__name__)
+
+# Shared default for callers that do not pass a batch critic. app.py
+# builds a ParallelOrchestrator per job; a fresh BatchCriticAgent each
+# time would make every _app_key unique, so the compiled-graph cache
+# would never hit and each job would leak a graph + checkpointer.
+_DEFAULT_BATCH_CRITIC: BatchCriticAgent | None = None
+
+
+def _default_batch_critic() -> BatchCriticAgent:
+    global _DEFAULT_BATCH_CRITIC
+    if _DEFAULT_BATCH_CRITIC is None:
+        _DEFAULT_BATCH_CRITIC = BatchCriticAgent()
+    return _DEFAULT_BATCH_CRITIC
+
 
 class ParallelOrchestrator(Orchestrator):
-    MAX_RERUNS = 2
 
     def __init__(
             self,
@@ -21,35 +41,68 @@ class ParallelOrchestrator(Orchestrator):
             critic_rep: CriticAgent,
             reporter: ReportAgent,
             assembler: AssemblerAgent,
+            critic_batch: BatchCriticAgent | None = None,
     ) -> None:
         self.assembler = assembler
         self.critic_rep = critic_rep
         self.critic_vis = critic_vis
+        # Both branch verdicts come from one coalesced LLM call; the
+        # per-branch critics stay accepted for API compatibility.
+        self.critic_batch = critic_batch or _default_batch_critic()
         super().__init__(analyst, visualizer, critic_vis, reporter)
 
-    def _node_visualizer(self, state: GraphState | GraphParallelState) -> GraphState | GraphParallelState:
+    def _app_key(self) -> tuple:
+        # critic_batch is keyed by identity like every other agent; a
+        # type key would let a differently configured batch critic reuse
+        # a graph bound to the first instance's model.
+        return super()._app_key() + (
+            self.critic_rep,
+            self.assembler,
+            self.critic_batch,
+        )
+
+    async def _node_visualizer(self, state: GraphState | GraphParallelState) -> GraphState | GraphParallelState:
         feedback = state.get("vis_critic_notes")
-        print(f"--- [Orchestrator] Running Visualizer Branch (Feedback present: {bool(feedback)}) ---")
+        logger.info("Running Visualizer Branch (Feedback present: %s)", bool(feedback))
+
+        # This branch also curates against critic feedback, so the memo key
+        # folds the notes in on top of the data/plan key.
+        key = self._viz_key(state) + f":{feedback or ''}"
+        cached = self._memo_get(key)
+        if cached is not None and os.path.isfile(cached.get("vis_report_path") or ""):
+            return cached
 
-        res = self.visualizer.run(
+        res = await self.visualizer.arun(
             data_path=state["data_path"],
+            data_path_parquet=state.get("data_path_parquet"),
             viz_plan=state["viz_plan"],
             critic_notes=feedback,
             critic_decision=state.get("vis_critic_decision")
         )
-        return {
+        # The agent writes a fixed report-vis.md that the next dataset
+        # overwrites, and this memo outlives a single job now that the
+        # orchestrator's graph is shared; pin the draft per digest like
+        # the analyst's cleaned artifacts.
+        tag = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        pinned = self._pin_artifact(
+            self._file_digest(state["data_path"]),
+            res["report_path"],
+            f"report-vis_{tag}.md",
+        )
+        out = {
             "plots": res["plots"],
             "plots_desc": res.get("plots_desc", []),
-            "vis_report_path": res["report_path"],
-            "vis_report_markdown": res["report_markdown"]
+            "vis_report_path": pinned or res["report_path"],
         }
+        self._memo_put(key, out)
+        return out
 
-    def _node_report_draft(self, state: GraphParallelState) -> GraphParallelState:
+    async def _node_report_draft(self, state: GraphParallelState) -> GraphParallelState:
         feedback = state.get("rep_critic_notes")
         decision = state.get("rep_critic_decision")
-        print(f"--- [Orchestrator] Running Reporter Branch (Feedback present: {bool(feedback)}) ---")
+        logger.info("Running Reporter Branch (Feedback present: %s)", bool(feedback))
 
-        res = self.reporter.run(
+        res = await self.reporter.arun(
             title="Measurement Data Report",
             analysis=state.get("analysis", ""),
             plots=state.get("plots", []),
@@ -58,93 +111,51 @@ class ParallelOrchestrator(Orchestrator):
         )
         return {
             "rep_report_path": res["report_path"],
-            "rep_report_markdown": res["report_markdown"],
-        }
-
-    def _node_critic_vis(self, state: GraphParallelState) -> GraphParallelState:
-        res = self.critic_vis.run(
-            report_path=state.get("vis_report_path"),
-            report_markdown=state.get("vis_report_markdown"),
-            analysis=state.get("analysis", ""),
-            plots=state.get("plots", []),
-        )
-        decision_norm = self._normalize_decision(res, prefix="vis_")
-        rerun_count = int(state.get("vis_rerun_count", 0))
-        notes = res.get("vis_critic_llm_feedback") or res.get("vis_critic_llm_raw") or "No details."
-
-        needs_correction = decision_norm in ["RERUN", "REJECT", "AMBIGUOUS"]
-        do_rerun = needs_correction and (rerun_count < self.MAX_RERUNS)
-
-        print(f"--- [Orchestrator] VIS Critic: {decision_norm} (Attempt {rerun_count}) ---")
-
-        return {
-            **res,
-            "vis_route_decision": decision_norm,
-            "vis_do_rerun": do_rerun,
-            "vis_rerun_count": rerun_count + 1 if do_rerun else rerun_count,
-            "vis_critic_notes": notes,
-            "vis_critic_decision": decision_norm
         }
 
-    def _node_critic_vis(self, state: GraphParallelState) -> GraphParallelState:
-        res = self.critic_vis.run(
-            report_path=state.get("vis_report_path"),
-            report_markdown=state.get("vis_report_markdown"),
-            analysis=state.get("analysis", ""),
-            plots=state.get("plots", []),
-        )
-        decision_norm = self._normalize_decision(res, prefix="vis_")
-        rerun_count = int(state.get("vis_rerun_count", 0))
-        notes = res.get("vis_critic_llm_feedback") or res.get("vis_critic_llm_raw") or "No details."
+    async def _node_critic(self, state: GraphParallelState) -> GraphParallelState:
+        """Joint review of both drafts in one coalesced LLM call.
 
-        needs_correction = decision_norm in ["RERUN", "REJECT", "AMBIGUOUS"]
-        do_rerun = needs_correction and (rerun_count < self.MAX_RERUNS)
-
-        print(f"--- [Orchestrator] VIS Critic: {decision_norm} (Attempt {rerun_count}) ---")
-
-        return {
-            **res,
-            "vis_route_decision": decision_norm,
-            "vis_do_rerun": do_rerun,
-            "vis_rerun_count": rerun_count + 1 if do_rerun else rerun_count,
-            "vis_critic_notes": notes,
-            "vis_critic_decision": decision_norm
-        }
-
-    def _node_critic_rep(self, state: GraphParallelState) -> GraphParallelState:
-        res = self.critic_rep.run(
-            report_path=state.get("rep_report_path"),
-            report_markdown=state.get("rep_report_markdown"),
-            analysis=state.get("analysis", ""),
-            plots=state.get("plots", []),
+        Both edges from the branches converge here, so the node runs once
+        both drafts exist; one round-trip replaces the two near-identical
+        critic prompts and the shared preamble is paid for once.
+        """
+        res = await self.critic_batch.arun(
+            vis_report_path=state.get("vis_report_path"),
+            rep_report_path=state.get("rep_report_path"),
         )
-        decision_norm = self._normalize_decision(res, prefix="rep_")
-        rerun_count = int(state.get("rep_rerun_count", 0))
-        notes = res.get("rep_critic_llm_feedback") or res.get("rep_critic_llm_raw") or "No details."
 
-        needs_correction = decision_norm in ["RERUN", "REJECT", "AMBIGUOUS"]
-        do_rerun = needs_correction and (rerun_count < self.MAX_RERUNS)
-
-        print(f"--- [Orchestrator] REP Critic: {decision_norm} (Attempt {rerun_count}) ---")
-
-        return {
-            **res,
-            "rep_route_decision": decision_norm,
-            "rep_do_rerun": do_rerun,
-            "rep_rerun_count": rerun_count + 1 if do_rerun else rerun_count,
-            "rep_critic_notes": notes,
-            "rep_critic_decision": decision_norm
-        }
+        out: GraphParallelState = {}
+        for p in ("vis_", "rep_"):
+            delta = self._critic_delta(res, state, prefix=p)
+            logger.info(
+                "%s Critic: %s (Attempt %d)",
+                p[:-1].upper(), delta[f"{p}route_decision"], int(state.get(f"{p}rerun_count", 0)),
+            )
+            out.update(delta)
+        return out
+
+    @staticmethod
+    def _read_md(path: str | None) -> str:
+        if not path:
+            return ""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return ""
 
     def _node_assembler(self, state: GraphParallelState) -> GraphParallelState:
-        print(f"--- [Orchestrator] Assembling Final Report ---")
+        logger.info("Assembling Final Report")
         res = self.assembler.run(
             title="Measurement Data Report - ASSEMBLED",
             overview="Auto-generated report from multi-agent pipeline.",
             analysis=state.get("analysis", ""),
             plots=state.get("plots", []),
-            rep_report_markdown=state.get("rep_report_markdown"),
-            vis_report_markdown=state.get("vis_report_markdown"),
+            # Drafts are read back lazily here; only their paths travel
+            # through the graph state.
+            rep_report_markdown=self._read_md(state.get("rep_report_path")),
+            vis_report_markdown=self._read_md(state.get("vis_report_path")),
             rep_report_path=state.get("rep_report_path"),
             vis_report_path=state.get("vis_report_path"),
             vis_critic_notes=state.get("vis_critic_notes"),
@@ -154,19 +165,25 @@ class ParallelOrchestrator(Orchestrator):
         )
         return {
             "final_report_path": res["final_report_path"],
-            "final_report_markdown": res.get("final_report_markdown", ""),
             "report_path": res["final_report_path"]  # For POC compatibility
         }
 
-    def _route_vis(self, state: GraphParallelState) -> str:
+    def _dispatch(self, state: GraphParallelState) -> list[Send]:
+        """Fan the analyst's output to both branches as independent Send
+        tasks, so the scheduler runs them as explicit parallel work
+        rather than two edges sharing a super-step."""
+        return [Send("visualizer", state), Send("report_draft", state)]
+
+    def _route_after_critic(self, state: GraphParallelState) -> list[str]:
+        """Rerun whichever branches the joint critic rejected; both may
+        restart in the same super-step. Only when neither needs another
+        pass does the assembler run."""
+        targets = []
         if state.get("vis_do_rerun"):
-            return "visualizer"
-        return "assembler"
-
-    def _route_rep(self, state: GraphParallelState) -> str:
+            targets.append("visualizer")
         if state.get("rep_do_rerun"):
-            return "report_draft"
-        return "assembler"
+            targets.append("report_draft")
+        return targets or ["assembler"]
 
     def _build(self):
         wf = StateGraph(GraphParallelState)
@@ -174,37 +191,32 @@ class ParallelOrchestrator(Orchestrator):
         wf.add_node("analyst", self._node_analyst)
         wf.add_node("visualizer", self._node_visualizer)
         wf.add_node("report_draft", self._node_report_draft)
-        wf.add_node("critic_vis", self._node_critic_vis)
-        wf.add_node("critic_rep", self._node_critic_rep)
+        wf.add_node("critic", self._node_critic)
         wf.add_node("assembler", self._node_assembler)
-        wf.add_edge("analyst", "visualizer")
-        wf.add_edge("analyst", "report_draft")
-        wf.add_edge("visualizer", "critic_vis")
-        wf.add_edge("report_draft", "critic_rep")
-        wf.add_conditional_edges(
-            "critic_vis",
-            self._route_vis,
-            {
-                "visualizer": "visualizer",
-                "assembler": "assembler"
-            },
-        )
+        wf.add_conditional_edges("analyst", self._dispatch, ["visualizer", "report_draft"])
+        wf.add_edge("visualizer", "critic")
+        wf.add_edge("report_draft", "critic")
         wf.add_conditional_edges(
-            "critic_rep",
-            self._route_rep,
-            {
-                "report_draft": "report_draft",
-                "assembler": "assembler"
-            },
+            "critic",
+            self._route_after_critic,
+            ["visualizer", "report_draft", "assembler"],
         )
         wf.add_edge("assembler", END)
 
-        return wf.compile()
+        return wf.compile(checkpointer=self._checkpointer)
 
-    def run(self, data_path: str | None = None) -> GraphParallelState:
-        initial: GraphParallelState = {
+    def _initial_state(self, data_path: str | None) -> GraphParallelState:
+        return {
             "vis_rerun_count": 0,
             "rep_rerun_count": 0,
-            "data_path": data_path or self.analyst.input_path
+            "data_path": data_path or self.analyst.input_path,
         }
-        return self._app.invoke(initial)
+
+    async def arun(self, data_path: str | None = None) -> GraphParallelState:
+        initial = self._initial_state(data_path)
+        return await self._app.ainvoke(initial, config=self._run_config(initial["data_path"]))
+
+    def run(self, data_path: str | None = None) -> GraphParallelState:
+        # Async nodes need ainvoke; sync callers get a thin event-loop
+        # wrapper so the app.py entry point is unchanged.
+        return asyncio.run(self.arun(data_path))
@@ -1,37 +1,43 @@
 from __future__ import annotations
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from langgraph.graph import StateGraph, END
 
-from agents.analyst import AnalystAgent
-from agents.visualizer import VisualizationAgent
-from agents.critic import CriticAgent
-from agents.report import ReportAgent
 from core.orchestrator import Orchestrator
 from .state import GraphState
 
+logger = logging.getLogger(__name__)
 
-class OrchestratorSequential(Orchestrator):
-    MAX_RERUNS = 2
 
-    def __init__(
-            self,
-            analyst: AnalystAgent,
-            visualizer: VisualizationAgent,
-            critic: CriticAgent,
-            reporter: ReportAgent,
-    ) -> None:
-        super().__init__(analyst, visualizer, critic, reporter)
+class OrchestratorSequential(Orchestrator):
 
     def _node_visualizer(self, state: GraphState) -> GraphState:
+        key = self._viz_key(state)
+        cached = self._memo_get(key)
+        if cached is not None:
+            return cached
+        csv_digest = self._file_digest(state["data_path"])
+        disk_name = f"viz_{self._plan_digest(state['viz_plan'])}.json"
+        cached = self._disk_get(csv_digest, disk_name)
+        if cached is not None and all(os.path.exists(p) for p in cached.get("plots", [])):
+            self._memo_put(key, cached)
+            return cached
         res = self.visualizer.run(
             data_path=state["data_path"],
+            data_path_parquet=state.get("data_path_parquet"),
             viz_plan=state["viz_plan"],
         )
-        return {"plots": res["plots"], "plots_desc": res.get("plots_desc", [])}
+        out = {"plots": res["plots"], "plots_desc": res.get("plots_desc", [])}
+        self._memo_put(key, out)
+        self._disk_put(csv_digest, disk_name, out)
+        return out
 
     def _node_report_draft(self, state: GraphState) -> GraphState:
         previous_notes = state.get("critic_notes")
         previous_decision = state.get("critic_decision")
-        print(f"--- [Orchestrator] Drafting Report (Has feedback: {bool(previous_notes)}) ---")
+        logger.info("Drafting Report (Has feedback: %s)", bool(previous_notes))
         res = self.reporter.run(
             title="Measurement Data Report",
             overview="Auto-generated report from multi-agent pipeline.",
@@ -45,6 +51,33 @@ class OrchestratorSequential(Orchestrator):
             "report_markdown": res.get("report_markdown", ""),
         }
 
+    def _draft_text(self, state: GraphState) -> GraphState:
+        """Preliminary text draft built from the analysis alone; plot paths
+        are not known until the visualizer finishes, so the first-pass draft
+        runs without them and the rerun/final passes fill them in."""
+        logger.info("Drafting Report (parallel with visualizer)")
+        res = self.reporter.run(
+            title="Measurement Data Report",
+            overview="Auto-generated report from multi-agent pipeline.",
+            analysis=state.get("analysis", ""),
+            plots=[],
+            critic_decision=None,
+            critic_notes=None,
+        )
+        return {
+            "report_path": res["report_path"],
+            "report_markdown": res.get("report_markdown", ""),
+        }
+
+    def _node_fanout(self, state: GraphState) -> GraphState:
+        """Fork-join: plot rendering and the first report draft only share
+        the analyst's outputs, so they run concurrently and the graph joins
+        their state fragments before the critic."""
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            f_viz = ex.submit(self._node_visualizer, state)
+            f_draft = ex.submit(self._draft_text, state)
+            return {**f_viz.result(), **f_draft.result()}
+
     def _node_critic(self, state: GraphState) -> GraphState:
         res = self.critic.run(
             report_path=state.get("report_path"),
@@ -52,34 +85,44 @@ class OrchestratorSequential(Orchestrator):
             analysis=state.get("analysis", ""),
             plots=state.get("plots", []),
         )
-        decision_norm = self._normalize_decision(res)
-        rerun_count = int(state.get("rerun_count", 0))
-        notes = res.get("critic_llm_feedback") or res.get("critic_llm_raw") or "No details."
-        needs_correction = decision_norm in ["RERUN", "REJECT", "AMBIGUOUS"]
-        do_rerun = needs_correction and (rerun_count < self.MAX_RERUNS)
-        print(f"--- [Orchestrator] Critic Decision: {decision_norm} (Raw: {res.get('critic_llm_decision')}) ---")
-        return {
-            **res,
-            "route_decision": decision_norm,
-            "do_rerun": do_rerun,
-            "rerun_count": rerun_count + 1 if do_rerun else rerun_count,
-            "critic_notes": notes,
-            "critic_decision": decision_norm
-        }
+        out = self._critic_delta(res, state)
+        logger.info("Critic Decision: %s (Raw: %s)", out["route_decision"], res.get("critic_llm_decision"))
+        return out
 
     def _node_report_final(self, state: GraphState) -> GraphState:
         decision = state.get("critic_decision")
         if not decision:
             decision = state.get("critic_llm_decision", "ACCEPT")
-        notes = state.get("critic_notes")
-        print(f"--- [Orchestrator] Finalizing Report with Status: {decision} ---")
+        logger.info("Finalizing Report with Status: %s", decision)
+
+        # The critic just accepted the draft, so regenerating it through
+        # the reporter would spend a second LLM call to produce the same
+        # content. Promote the accepted markdown to the final name instead.
+        # Exception: the fanout's first draft is written before the plot
+        # paths exist, so if the rendered plots never made it into the
+        # accepted markdown the final pass must still regenerate with them.
+        src = state.get("report_path")
+        plots = state.get("plots", [])
+        markdown = state.get("report_markdown", "")
+        has_plots = not plots or any(p in markdown for p in plots)
+        if src and has_plots and os.path.exists(src):
+            out_path = os.path.join(os.path.dirname(src), "report_final.md")
+            if os.path.abspath(src) != os.path.abspath(out_path):
+                os.replace(src, out_path)
+            return {
+                "report_path": out_path,
+                "report_markdown": state.get("report_markdown", ""),
+            }
+
+        # Draft went missing or lacks the plot sections; regenerate once
+        # with the full plot list.
         res = self.reporter.run(
             title="Measurement Data Report - FINAL",
             overview="Final verified version.",
             analysis=state.get("analysis", ""),
             plots=state.get("plots", []),
             critic_decision=decision,
-            critic_notes=notes,
+            critic_notes=state.get("critic_notes"),
             out_name="report_final.md"
         )
         return {
@@ -92,21 +135,44 @@ class OrchestratorSequential(Orchestrator):
             return "report_draft"
         return "report_final"
 
+    def _initial_state(self, data_path: str | None) -> GraphState:
+        return {
+            "rerun_count": 0,
+            "data_path": data_path or self.analyst.input_path,
+        }
+
     def run(self, data_path: str | None = None) -> GraphState:
-        initial: GraphState = {"rerun_count": 0}
-        initial["data_path"] = data_path or self.analyst.input_path
-        return self._app.invoke(initial)
+        return self._run_fastpath(self._initial_state(data_path))
+
+    def _run_fastpath(self, initial: GraphState) -> GraphState:
+        """Call the nodes directly for the common single-pass run.
+
+        The accept path is strictly linear, so the StateGraph's per-node
+        state merging and dispatch buy nothing there. Only when the
+        critic asks for a rerun does the full graph take over (from the
+        start; the analyst/visualizer memos make the replay free)."""
+        state: GraphState = dict(initial)
+        state.update(self._node_analyst(state))
+        state.update(self._node_fanout(state))
+        state.update(self._node_critic(state))
+        if not state.get("do_rerun"):
+            state.update(self._node_report_final(state))
+            return state
+        return self._app.invoke(initial, config=self._run_config(initial.get("data_path")))
 
     def _build(self):
         wf = StateGraph(GraphState)
         wf.add_node("analyst", self._node_analyst)
-        wf.add_node("visualizer", self._node_visualizer)
+        wf.add_node("fanout", self._node_fanout)
         wf.add_node("report_draft", self._node_report_draft)
         wf.add_node("critic", self._node_critic)
         wf.add_node("report_final", self._node_report_final)
         wf.set_entry_point("analyst")
-        wf.add_edge("analyst", "visualizer")
-        wf.add_edge("visualizer", "report_draft")
+        wf.add_edge("analyst", "fanout")
+        wf.add_edge("fanout", "critic")
+        # Close the rerun loop: a redraft goes back to the critic for
+        # re-review instead of dead-ending (which would end the run
+        # without ever reaching report_final).
         wf.add_edge("report_draft", "critic")
         wf.add_conditional_edges(
             "critic",
@@ -117,4 +183,4 @@ class OrchestratorSequential(Orchestrator):
             },
         )
         wf.add_edge("report_final", END)
-        return wf.compile()
+        return wf.compile(checkpointer=self._checkpointer)
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import TypedDict, Any, List
+import operator
+from typing import Annotated, TypedDict, Any, List
 
 
 class GraphState(TypedDict, total=False):
@@ -7,6 +8,9 @@ class GraphState(TypedDict, total=False):
     # Analyst outputs
     analysis: str
     data_path: str
+    # Columnar copy of the cleaned frame; downstream nodes reload it
+    # instead of re-parsing the CSV.
+    data_path_parquet: str
     viz_plan: dict[str, Any]
 
     # Visualizer outputs
@@ -32,17 +36,20 @@ class GraphParallelState(TypedDict, total=False):
     # Analyst outputs
     analysis: str
     data_path: str
+    data_path_parquet: str
     viz_plan: dict[str, Any]
 
-    # Visualizer outputs
+    # Visualizer outputs. Only the path travels through the graph; the
+    # markdown stays on disk and is read lazily by whoever needs it, so
+    # LangGraph does not copy multi-KB blobs on every super-step.
     plots: List[str]
-    plots_desc: List[str]
+    # Accumulates across branch reruns instead of being overwritten, so
+    # concurrent writers merge rather than race on the whole list.
+    plots_desc: Annotated[List[str], operator.add]
     vis_report_path: str
-    vis_report_markdown: str
 
     # Report outputs
     rep_report_path: str
-    rep_report_markdown: str
 
     # Critic / routing
     vis_critic_decision: str
@@ -64,4 +71,3 @@ class GraphParallelState(TypedDict, total=False):
 
     # Assembler outputs
     final_report_path: str
-    final_report_markdown: str
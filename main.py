@@ -1,6 +1,11 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 from agents.analyst import AnalystAgent
 from agents.assemble import AssemblerAgent
@@ -13,7 +18,35 @@ from utils.utils import ensure_dirs
 from dotenv import load_dotenv
 load_dotenv()
 
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """Route all log records through a queue so emitting a record never
+    blocks on the stdout lock; a single listener thread does the actual
+    formatting and IO, keeping the parallel branches off each other."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("--- [%(name)s] %(message)s ---"))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+
+
+async def stream_run(orch, data_path: str) -> dict:
+    """Drive the pipeline via arun_stream, printing each node's delta as
+    it lands; first output appears after the first node instead of after
+    the whole DAG."""
+    result: dict = {}
+    async for node, delta in orch.arun_stream(data_path=data_path):
+        print(f"[{node}] done: {', '.join(delta or {})}")
+        result.update(delta or {})
+    return result
+
+
 if __name__ == "__main__":
+    setup_logging()
     parser = argparse.ArgumentParser(description="Uruchomienie Orkiestratora Systemu NLP")
     ensure_dirs()
     parser.add_argument(
@@ -23,6 +56,11 @@ if __name__ == "__main__":
         default='seq',
         help="Tryb działania: 'seq' (sekwencyjny) lub 'par' (równoległy). Domyślnie: seq"
     )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help="Strumieniuj wyniki węzłów w trakcie działania zamiast czekać na cały pipeline."
+    )
     args = parser.parse_args()
     if args.mode == 'seq':
         print("Hello")
@@ -50,7 +88,10 @@ if __name__ == "__main__":
     print("\n=== RUN ===")
     # result = orch.run()
     # result = orch.run(data_path="data/input/sales_data.csv")
-    result = orch.run(data_path="data/input/winequality-red.csv")
+    if args.stream:
+        result = asyncio.run(stream_run(orch, "data/input/winequality-red.csv"))
+    else:
+        result = orch.run(data_path="data/input/winequality-red.csv")
 
     print("\n=== FINAL RESULT ===")
     for k, v in result.items():
@@ -1,166 +1,152 @@
 import os
 import re
-import base64
-import markdown
-
-
-def embed_images_in_markdown(md_path: str) -> None:
-    """Embed images in markdown file as base64 data URIs in HTML img tags."""
-    project_root = os.getcwd()
-
-    with open(md_path, 'r', encoding='utf-8') as f:
-        md_content = f.read()
-
-    def replace_img_tag(match):
-        full_tag = match.group(0)
-        src_match = re.search(r'src=["\']([^"\']+)["\']', full_tag)
-        if not src_match:
-            return full_tag
-
-        img_path = src_match.group(1)
-
-        if img_path.startswith(('data:', 'file://', 'http://', 'https://')):
-            return full_tag
-
-        if not os.path.isabs(img_path):
-            abs_img_path = os.path.abspath(os.path.join(project_root, img_path))
-        else:
-            abs_img_path = os.path.abspath(img_path)
-
-        if os.path.exists(abs_img_path):
-            try:
-                with open(abs_img_path, 'rb') as img_file:
-                    img_data = img_file.read()
-                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                    ext = os.path.splitext(abs_img_path)[1].lower()
-                    mime_types = {
-                        '.png': 'image/png',
-                        '.jpg': 'image/jpeg',
-                        '.jpeg': 'image/jpeg',
-                        '.gif': 'image/gif',
-                        '.svg': 'image/svg+xml',
-                        '.webp': 'image/webp'
-                    }
-                    mime_type = mime_types.get(ext, 'image/png')
-                    data_uri = f'data:{mime_type};base64,{img_base64}'
-                    return full_tag.replace(f'src="{img_path}"', f'src="{data_uri}"').replace(f"src='{img_path}'", f"src='{data_uri}'")
-            except Exception:
-                return full_tag
-
-        return full_tag
-
-    img_pattern = r'<img[^>]+>'
-    md_content = re.sub(img_pattern, replace_img_tag, md_content)
-
-    def replace_markdown_image(match):
-        alt_text = match.group(1)
-        img_path = match.group(2)
-
-        if img_path.startswith(('data:', 'file://', 'http://', 'https://')):
-            return match.group(0)
-
-        if not os.path.isabs(img_path):
-            abs_img_path = os.path.abspath(os.path.join(project_root, img_path))
-        else:
-            abs_img_path = os.path.abspath(img_path)
-
-        if os.path.exists(abs_img_path):
-            try:
-                with open(abs_img_path, 'rb') as img_file:
-                    img_data = img_file.read()
-                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                    ext = os.path.splitext(abs_img_path)[1].lower()
-                    mime_types = {
-                        '.png': 'image/png',
-                        '.jpg': 'image/jpeg',
-                        '.jpeg': 'image/jpeg',
-                        '.gif': 'image/gif',
-                        '.svg': 'image/svg+xml',
-                        '.webp': 'image/webp'
-                    }
-                    mime_type = mime_types.get(ext, 'image/png')
-                    data_uri = f'data:{mime_type};base64,{img_base64}'
-                    return f'<img src="{data_uri}" alt="{alt_text}" />'
-            except Exception:
-                return match.group(0)
-
-        return match.group(0)
-
-    md_image_pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
-    md_content = re.sub(md_image_pattern, replace_markdown_image, md_content)
-
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(md_content)
-
-
-def convert_markdown_to_html(md_path: str, html_path: str) -> None:
-    """Convert markdown file to HTML with embedded images as base64 data URIs for standalone viewing."""
-    with open(md_path, 'r', encoding='utf-8') as f:
-        md_content = f.read()
-
-    html_content = markdown.markdown(
-        md_content,
-        extensions=['extra', 'codehilite', 'tables']
-    )
-
-    project_root = os.getcwd()
-    html_dir = os.path.dirname(os.path.abspath(html_path))
-
-    def fix_img_tag(match):
-        full_tag = match.group(0)
-        src_match = re.search(r'src=["\']([^"\']+)["\']', full_tag)
-        if not src_match:
-            return full_tag
-
-        img_path = src_match.group(1)
-
-        if img_path.startswith(('data:', 'file://', 'http://', 'https://')):
-            return full_tag
-
-
-        if not os.path.isabs(img_path):
-            abs_img_path = os.path.abspath(os.path.join(project_root, img_path))
+import functools
+
+try:
+    # Drop-in stdlib-compatible API; dispatches to SIMD (AVX2/NEON)
+    # kernels at runtime, which dominates on multi-MB plot PNGs.
+    import pybase64 as base64
+except ImportError:
+    import base64
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .md_cache import render_cached
+
+# One Markdown instance per process: constructing it reloads the
+# extensions and rebuilds every tree processor. reset() between converts
+# is far cheaper; the instance is not thread-safe, hence the lock (the
+# app runs conversions from an executor pool). Both the import and the
+# construction are deferred to the first render: pulling in the
+# extension registry plus Pygments costs hundreds of milliseconds of
+# cold start that callers who never render HTML should not pay.
+_MD = None
+_MD_LOCK = threading.Lock()
+
+
+def _render_md(md_content: str) -> str:
+    global _MD
+    with _MD_LOCK:
+        if _MD is None:
+            import markdown
+
+            _MD = markdown.Markdown(
+                extensions=['extra', 'codehilite', 'tables'],
+                output_format='html5',
+            )
+        return _MD.reset().convert(md_content)
+
+
+def _md_to_html(md_content: str) -> str:
+    # Identical bodies (agent reruns, re-exports) skip the parse and the
+    # Pygments highlighting entirely.
+    return render_cached(md_content, _render_md)
+
+_IMG_RE = re.compile(r'<img[^>]+>')
+_SRC_RE = re.compile(r'src=["\']([^"\']+)["\']')
+_SRC_SUB_RE = re.compile(r'(src\s*=\s*["\'])[^"\']+(["\'])')
+_SRC_RE_B = re.compile(rb'src=["\']([^"\']+)["\']')
+_SRC_SUB_RE_B = re.compile(rb'(src\s*=\s*["\'])[^"\']+(["\'])')
+
+
+def _iter_image_refs(data: bytes):
+    """Yield (kind, start, end, alt, path) for every image reference.
+
+    Hand-rolled find() tokenizer over the raw bytes: the inlining pass
+    runs on documents that are mostly multi-MB base64 payload, where a
+    regex alternation pays per-byte engine overhead and Match
+    allocations for exact-literal delimiters. kind is 'html' for
+    <img ...> tags (alt/path None) and 'md' for ![alt](path)."""
+    pos = 0
+    n = len(data)
+    while pos < n:
+        i_html = data.find(b'<img', pos)
+        i_md = data.find(b'![', pos)
+        if i_html == -1 and i_md == -1:
+            return
+        if i_md == -1 or (i_html != -1 and i_html < i_md):
+            end = data.find(b'>', i_html + 4)
+            if end == -1:
+                return
+            yield 'html', i_html, end + 1, None, None
+            pos = end + 1
         else:
-            abs_img_path = os.path.abspath(img_path)
-
-        if os.path.exists(abs_img_path):
-            try:
-                with open(abs_img_path, 'rb') as img_file:
-                    img_data = img_file.read()
-                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                    ext = os.path.splitext(abs_img_path)[1].lower()
-                    mime_types = {
-                        '.png': 'image/png',
-                        '.jpg': 'image/jpeg',
-                        '.jpeg': 'image/jpeg',
-                        '.gif': 'image/gif',
-                        '.svg': 'image/svg+xml',
-                        '.webp': 'image/webp'
-                    }
-                    mime_type = mime_types.get(ext, 'image/png')
-                    data_uri = f'data:{mime_type};base64,{img_base64}'
-                    return full_tag.replace(f'src="{img_path}"', f'src="{data_uri}"').replace(f"src='{img_path}'", f"src='{data_uri}'")
-            except Exception:
-                try:
-                    rel_path = os.path.relpath(abs_img_path, html_dir)
-                    rel_path = rel_path.replace('\\', '/')
-                    return full_tag.replace(f'src="{img_path}"', f'src="{rel_path}"').replace(f"src='{img_path}'", f"src='{rel_path}'")
-                except ValueError:
-                    return full_tag
-
-        return full_tag
-
-    img_pattern = r'<img[^>]+>'
-    html_content = re.sub(img_pattern, fix_img_tag, html_content)
-
-    full_html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Data Analysis Report</title>
-    <style>
-        body {{
+            close = data.find(b']', i_md + 2)
+            if close == -1:
+                return
+            if data[close + 1:close + 2] != b'(':
+                pos = i_md + 2
+                continue
+            rpar = data.find(b')', close + 2)
+            if rpar == -1:
+                return
+            if rpar == close + 2:  # empty path never matched the old regex
+                pos = i_md + 2
+                continue
+            yield 'md', i_md, rpar + 1, data[i_md + 2:close], data[close + 2:rpar]
+            pos = rpar + 1
+
+
+def _sub_image_refs(data: bytes, repl_html, repl_md) -> bytes:
+    """Rebuild data with each image reference replaced; untouched spans
+    are emitted as slices, so a document with no matches is returned
+    as-is with no copy."""
+    out = []
+    pos = 0
+    for kind, start, end, alt, path in _iter_image_refs(data):
+        out.append(data[pos:start])
+        token = data[start:end]
+        out.append(repl_html(token) if kind == 'html' else repl_md(token, alt, path))
+        pos = end
+    if not out:
+        return data
+    out.append(data[pos:])
+    return b''.join(out)
+
+_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.webp': 'image/webp'
+}
+
+
+@functools.lru_cache(maxsize=512)
+def _img_data_uri_cached(abs_img_path: str, mtime_ns: int, size: int) -> bytes:
+    with open(abs_img_path, 'rb') as img_file:
+        img_b64 = base64.b64encode(img_file.read())
+    # rpartition beats splitext here: no basename scan, no tuple of the
+    # whole path. A dotless name just falls through to the default mime.
+    ext = '.' + abs_img_path.rpartition('.')[2].lower()
+    mime_type = _MIME_TYPES.get(ext, 'image/png')
+    # One join of exact-size pieces; the payload stays bytes end to end,
+    # so the bytes-mode inlining pass splices the cached value straight
+    # into the document with no per-occurrence encode.
+    return b''.join((b'data:', mime_type.encode('ascii'), b';base64,', img_b64))
+
+
+def _img_data_uri_b(abs_img_path: str) -> bytes:
+    """Base64 data URI for an image file, memoized on its stat signature.
+
+    A report references the same plot from several passes (markdown
+    embed, HTML export, PDF export), so each file is read and encoded at
+    most once; keying on (path, mtime, size) keeps the cache correct
+    even for image paths that are not content-hashed.
+    """
+    st = os.stat(abs_img_path)
+    return _img_data_uri_cached(abs_img_path, st.st_mtime_ns, st.st_size)
+
+
+def _img_data_uri(abs_img_path: str) -> str:
+    """str view of _img_data_uri_b for the HTML (text-mode) pass."""
+    return _img_data_uri_b(abs_img_path).decode('ascii')
+
+# Shared report stylesheet; rendered into the standalone HTML page and
+# parsed once into a WeasyPrint CSS object for PDF export.
+_STYLE_BLOCK = """
+        body {
             font-family: 'DejaVu Sans', Arial, sans-serif;
             line-height: 1.6;
             color: #333;
@@ -168,72 +154,335 @@ def convert_markdown_to_html(md_path: str, html_path: str) -> None:
             margin: 0 auto;
             padding: 20px;
             background-color: #f5f5f5;
-        }}
-        .container {{
+        }
+        .container {
             background: white;
             padding: 40px;
             border-radius: 8px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
+        }
+        h1 {
             color: #8b5cf6;
             border-bottom: 2px solid #8b5cf6;
             padding-bottom: 10px;
-        }}
-        h2 {{
+        }
+        h2 {
             color: #3b82f6;
             margin-top: 30px;
-        }}
-        h3 {{
+        }
+        h3 {
             color: #f97316;
-        }}
-        img {{
+        }
+        img {
             max-width: 100%;
             height: auto;
             margin: 15px 0;
             display: block;
             border: 1px solid #ddd;
             border-radius: 4px;
-        }}
-        code {{
+        }
+        code {
             background-color: #f4f4f4;
             padding: 2px 6px;
             border-radius: 3px;
             font-family: 'Courier New', monospace;
-        }}
-        pre {{
+        }
+        pre {
             background-color: #f4f4f4;
             padding: 15px;
             border-radius: 5px;
             overflow-x: auto;
             border: 1px solid #ddd;
-        }}
-        table {{
+        }
+        table {
             border-collapse: collapse;
             width: 100%;
             margin: 15px 0;
-        }}
-        th, td {{
+        }
+        th, td {
             border: 1px solid #ddd;
             padding: 8px;
             text-align: left;
-        }}
-        th {{
+        }
+        th {
             background-color: #8b5cf6;
             color: white;
-        }}
-        tr:nth-child(even) {{
+        }
+        tr:nth-child(even) {
             background-color: #f9f9f9;
-        }}
-    </style>
+        }
+"""
+
+# WeasyPrint's CSS parse and font-config construction cost hundreds of
+# milliseconds; both are process-lifetime objects, built on first PDF.
+_PDF_CTX = None
+
+
+def _pdf_context():
+    global _PDF_CTX
+    if _PDF_CTX is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        font_cfg = FontConfiguration()
+        _PDF_CTX = (CSS(string=_STYLE_BLOCK, font_config=font_cfg), font_cfg)
+    return _PDF_CTX
+
+
+def convert_markdown_to_pdf(md_path: str, pdf_path: str) -> None:
+    """Convert markdown report to PDF via WeasyPrint.
+
+    The stylesheet and font configuration are reused across calls, so
+    each request only pays for layout and render, and the PDF is written
+    straight to pdf_path without an intermediate buffer.
+    """
+    from weasyprint import HTML
+
+    with open(md_path, 'r', encoding='utf-8') as f:
+        md_content = f.read()
+
+    html_content = _md_to_html(md_content)
+
+    full_html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"></head>' \
+                f'<body><div class="container">{html_content}</div></body></html>'
+
+    css, font_cfg = _pdf_context()
+    HTML(string=full_html, base_url=os.getcwd()).write_pdf(
+        target=pdf_path,
+        stylesheets=[css],
+        font_config=font_cfg,
+        presentational_hints=False,
+        optimize_images=True,
+    )
+
+
+# WeasyPrint's layout loop is CPU-bound and holds the GIL, so concurrent
+# jobs on the thread executor would serialize on it. Rendering in worker
+# processes lets multi-core machines lay out several PDFs at once. The
+# pool is built on first use so importing this module stays cheap.
+_PDF_POOL = None
+_PDF_POOL_LOCK = threading.Lock()
+
+
+def convert_markdown_to_pdf_pooled(md_path: str, pdf_path: str) -> None:
+    """convert_markdown_to_pdf, executed in a dedicated process pool."""
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            _PDF_POOL = ProcessPoolExecutor(
+                max_workers=(os.cpu_count() or 2) // 2 or 1
+            )
+    _PDF_POOL.submit(convert_markdown_to_pdf, md_path, pdf_path).result()
+
+
+def _resolve_local(img_path: str, project_root: str) -> str | None:
+    """Absolute path for a local image reference, or None for remote /
+    already-inlined / missing targets."""
+    if img_path.startswith(('data:', 'file://', 'http://', 'https://')):
+        return None
+    if not os.path.isabs(img_path):
+        abs_img_path = os.path.abspath(os.path.join(project_root, img_path))
+    else:
+        abs_img_path = os.path.abspath(img_path)
+    return abs_img_path if os.path.exists(abs_img_path) else None
+
+
+def _prefetch_data_uris(md_content: bytes, project_root: str) -> None:
+    """Warm the data-URI memo for every unique image concurrently.
+
+    The regex callbacks run serially, so without this each file's
+    open/read waits on the previous one; reads release the GIL, and a
+    small thread pool overlaps that latency before the substitution
+    pass begins."""
+    paths = set()
+    for kind, start, end, alt, path in _iter_image_refs(md_content):
+        if kind == 'html':
+            src = _SRC_RE_B.search(md_content, start, end)
+            if src is None:
+                continue
+            img_path = src.group(1)
+        else:
+            img_path = path
+        abs_img_path = _resolve_local(img_path.decode('utf-8', 'replace'), project_root)
+        if abs_img_path is not None:
+            paths.add(abs_img_path)
+    if len(paths) < 2:
+        return
+
+    def _warm(p: str) -> None:
+        try:
+            _img_data_uri_b(p)
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as ex:
+        list(ex.map(_warm, paths))
+
+
+def _inline_images(md_content: bytes) -> bytes:
+    """Replace local image references with base64 data URIs, in memory.
+
+    Operates on the raw bytes so callers can shuttle the document from
+    file to file without decoding megabytes of base64 payload."""
+    # Intermediate agent outputs are often imageless; two substring
+    # probes are far cheaper than a full regex walk that replaces nothing.
+    if b'<img' not in md_content and b'![' not in md_content:
+        return md_content
+
+    project_root = os.getcwd()
+    _prefetch_data_uris(md_content, project_root)
+
+    def replace_img_tag(full_tag):
+        # Already-inlined tags dominate on second passes; skip even the
+        # src search for them.
+        if b'data:' in full_tag:
+            return full_tag
+        src_match = _SRC_RE_B.search(full_tag)
+        if not src_match:
+            return full_tag
+
+        abs_img_path = _resolve_local(src_match.group(1).decode('utf-8', 'replace'), project_root)
+        if abs_img_path is None:
+            return full_tag
+        try:
+            data_uri = _img_data_uri_b(abs_img_path)
+            return _SRC_SUB_RE_B.sub(lambda m: m.group(1) + data_uri + m.group(2), full_tag, count=1)
+        except Exception:
+            return full_tag
+
+    def replace_markdown_image(token, alt, path):
+        abs_img_path = _resolve_local(path.decode('utf-8', 'replace'), project_root)
+        if abs_img_path is None:
+            return token
+        try:
+            data_uri = _img_data_uri_b(abs_img_path)
+            return b''.join((b'<img src="', data_uri, b'" alt="', alt, b'" />'))
+        except Exception:
+            return token
+
+    return _sub_image_refs(md_content, replace_img_tag, replace_markdown_image)
+
+
+def embed_images_in_markdown(md_path: str) -> None:
+    """Embed images in markdown file as base64 data URIs in HTML img tags."""
+    with open(md_path, 'rb') as f:
+        md_content = f.read()
+
+    md_content = _inline_images(md_content)
+
+    with open(md_path, 'wb') as f:
+        f.write(md_content)
+
+
+# Everything around the report body is constant; keeping it as two
+# pre-encoded blocks lets the file writer stream header/body/footer
+# without ever materializing the full page string.
+_PAGE_HEADER_STR = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Data Analysis Report</title>
+    <style>{_STYLE_BLOCK}    </style>
 </head>
 <body>
     <div class="container">
-        {html_content}
+        """
+_PAGE_FOOTER_STR = """
     </div>
 </body>
 </html>"""
+_PAGE_HEADER = _PAGE_HEADER_STR.encode('utf-8')
+_PAGE_FOOTER = _PAGE_FOOTER_STR.encode('utf-8')
+
+
+def _wrap_page(html_content: str) -> str:
+    return _PAGE_HEADER_STR + html_content + _PAGE_FOOTER_STR
+
+
+def _write_page(html_path: str, html_content: str) -> None:
+    """Write the standalone page in three binary writes; for multi-MB
+    reports this halves peak memory versus building the page f-string
+    and then buffering its encoded copy."""
+    with open(html_path, 'wb') as f:
+        f.write(_PAGE_HEADER)
+        f.write(html_content.encode('utf-8'))
+        f.write(_PAGE_FOOTER)
+
+
+def render_all(md_path: str, html_path: str, pdf_path: str | None = None) -> None:
+    """Read the report markdown once and produce every output from it.
+
+    Fuses embed_images_in_markdown + convert_markdown_to_html (+ the PDF
+    export when pdf_path is given): one read of the markdown, one image
+    inlining pass, one markdown parse, instead of three reads and two
+    parses across the separate calls.
+    """
+    with open(md_path, 'rb') as f:
+        md_bytes = f.read()
+
+    md_bytes = _inline_images(md_bytes)
+    with open(md_path, 'wb') as f:
+        f.write(md_bytes)
+
+    # The only decode: the markdown parser needs str.
+    html_body = _md_to_html(md_bytes.decode('utf-8'))
+    _write_page(html_path, html_body)
+
+    if pdf_path:
+        from weasyprint import HTML
+
+        full_html = _wrap_page(html_body)
+
+        css, font_cfg = _pdf_context()
+        HTML(string=full_html, base_url=os.getcwd()).write_pdf(
+            target=pdf_path,
+            stylesheets=[css],
+            font_config=font_cfg,
+            presentational_hints=False,
+            optimize_images=True,
+        )
+
+
+def convert_markdown_to_html(md_path: str, html_path: str) -> None:
+    """Convert markdown file to HTML with embedded images as base64 data URIs for standalone viewing."""
+    with open(md_path, 'r', encoding='utf-8') as f:
+        md_content = f.read()
+
+    html_content = _md_to_html(md_content)
+
+    if '<img' not in html_content:
+        _write_page(html_path, html_content)
+        return
+
+    project_root = os.getcwd()
+    html_dir = os.path.dirname(os.path.abspath(html_path))
+
+    def fix_img_tag(match):
+        full_tag = match.group(0)
+        # embed_images_in_markdown usually ran first, so the tag already
+        # carries a data URI; bail before any regex work.
+        if 'data:' in full_tag:
+            return full_tag
+        src_match = _SRC_RE.search(full_tag)
+        if not src_match:
+            return full_tag
+
+        abs_img_path = _resolve_local(src_match.group(1), project_root)
+        if abs_img_path is None:
+            return full_tag
+        try:
+            data_uri = _img_data_uri(abs_img_path)
+            return _SRC_SUB_RE.sub(lambda m: m.group(1) + data_uri + m.group(2), full_tag, count=1)
+        except Exception:
+            try:
+                rel_path = os.path.relpath(abs_img_path, html_dir)
+                rel_path = rel_path.replace('\\', '/')
+                return _SRC_SUB_RE.sub(lambda m: m.group(1) + rel_path + m.group(2), full_tag, count=1)
+            except ValueError:
+                return full_tag
+
+    html_content = _IMG_RE.sub(fix_img_tag, html_content)
 
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(full_html)
+    _write_page(html_path, html_content)
 
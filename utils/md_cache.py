@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable
+
+# Content-keyed cache for markdown -> HTML rendering. The codehilite
+# extension runs Pygments per fenced block, which makes the convert the
+# hottest step of report export; agents regularly re-emit identical
+# markdown across reruns, so renders are memoized in-process and on
+# disk. Disable with AGENT_MD_CACHE=0.
+_CACHE_DIR = os.environ.get("AGENT_MD_CACHE_DIR", "data/.md_cache")
+_MEM: OrderedDict[str, str] = OrderedDict()
+_MEM_MAX = 256
+
+
+def enabled() -> bool:
+    return os.environ.get("AGENT_MD_CACHE", "1") != "0"
+
+
+def _key(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:24]
+
+
+def render_cached(body: str, render: Callable[[str], str]) -> str:
+    """Return render(body), memoized on a content hash of body."""
+    if not enabled():
+        return render(body)
+    key = _key(body)
+    hit = _MEM.get(key)
+    if hit is not None:
+        _MEM.move_to_end(key)
+        return hit
+    path = os.path.join(_CACHE_DIR, key + ".html")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+    except OSError:
+        html = render(body)
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            tmp = os.path.join(_CACHE_DIR, f".{key}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(html)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    _MEM[key] = html
+    while len(_MEM) > _MEM_MAX:
+        _MEM.popitem(last=False)
+    return html
@@ -1,17 +1,35 @@
 from __future__ import annotations
 import os
-from typing import Dict
+import re
+from types import MappingProxyType
+from typing import Iterable, Mapping
 
+_EXT_RE = re.compile(r'\.([A-Za-z0-9]+)$')
 
-def ensure_dirs() -> Dict[str, str]:
-    out_root = "data/output"
-    plots = f"{out_root}/plots"
-    os.makedirs(out_root, exist_ok=True)
-    os.makedirs(plots, exist_ok=True)
-    return {"out_root": out_root, "plots": plots}
+# Callers never mutate the returned mapping, so every call shares one
+# read-only view instead of allocating a fresh dict.
+_DIRS_VIEW: Mapping[str, str] = MappingProxyType({
+    "out_root": "data/output",
+    "plots": os.path.join("data/output", "plots"),
+})
+_DIRS_READY = False
 
 
-def allowed_file(filename: str, allowed_extensions: list[str]) -> bool:
-    """Check if file extension is allowed."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in allowed_extensions
+def ensure_dirs() -> Mapping[str, str]:
+    """Create the output directories, once per process.
+
+    makedirs stats the whole path even with exist_ok, so repeat calls
+    short-circuit on the module flag; creating the leaf also creates its
+    parent, halving the syscalls on the first call.
+    """
+    global _DIRS_READY
+    if not _DIRS_READY:
+        os.makedirs(_DIRS_VIEW["plots"], exist_ok=True)
+        _DIRS_READY = True
+    return _DIRS_VIEW
+
+
+def allowed_file(filename: str, allowed_extensions: Iterable[str]) -> bool:
+    """Check if file extension is allowed (single anchored-regex pass)."""
+    m = _EXT_RE.search(filename)
+    return bool(m) and m.group(1).lower() in allowed_extensions